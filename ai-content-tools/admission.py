@@ -0,0 +1,111 @@
+"""
+İstek kabul kontrolü ve istek başına bütçeler.
+
+AdmissionController: endpoint başına eşzamanlı istek sınırı + sınırlı bekleme
+kuyruğu; kuyruk doluysa istek hemen reddedilir (HTTP 429).
+RequestBudget: istek başına token bütçesi ve sunucu tarafı deadline; aşıldığında
+skorlama durur ve o ana kadarki sonuçlar truncated: true ile döner.
+"""
+import threading
+import time
+
+class RequestBudget:
+    def __init__(self, max_tokens=None, deadline_seconds=None, started=None):
+        self.max_tokens = max_tokens or None
+        self.deadline_seconds = deadline_seconds or None
+        self.started = started if started is not None else time.monotonic()
+        self.tokens_used = 0
+        self.reason = None
+
+    @property
+    def truncated(self):
+        return self.reason is not None
+
+    def remaining_seconds(self):
+        if self.deadline_seconds is None:
+            return None
+        return self.deadline_seconds - (time.monotonic() - self.started)
+
+    def expired(self):
+        """Deadline geçtiyse True döner ve nedeni kaydeder"""
+        remaining = self.remaining_seconds()
+        if remaining is not None and remaining <= 0:
+            self.reason = self.reason or 'deadline'
+            return True
+        return False
+
+    def try_charge(self, tokens):
+        """
+        Token bütçesinden düşer; sığmıyorsa düşmeden False döner ve nedeni kaydeder
+        """
+        if self.max_tokens is not None and self.tokens_used + tokens > self.max_tokens:
+            self.reason = self.reason or 'token_budget'
+            return False
+        self.tokens_used += tokens
+        return True
+
+    def admit_prefix(self, token_counts):
+        """Bütçeye sığan en uzun ön ekin uzunluğu"""
+        admitted = 0
+        for count in token_counts:
+            if not self.try_charge(count):
+                break
+            admitted += 1
+        return admitted
+
+    def summary(self):
+        return {
+            'truncated': self.truncated,
+            **({'truncation_reason': self.reason} if self.truncated else {})
+        }
+
+class AdmissionRejected(Exception):
+    pass
+
+class AdmissionController:
+    def __init__(self, max_concurrent, max_queue, queue_timeout=30.0):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self.rejected_total = 0
+
+    def acquire(self, timeout=None):
+        """
+        Slot alır. Tüm slotlar doluysa kuyrukta bekler; kuyruk doluysa ya da
+        bekleme süresi dolarsa AdmissionRejected fırlatır.
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        with self._condition:
+            if self._active < self.max_concurrent:
+                self._active += 1
+                return
+            if self._waiting >= self.max_queue:
+                self.rejected_total += 1
+                raise AdmissionRejected('queue full')
+            self._waiting += 1
+            try:
+                admitted = self._condition.wait_for(lambda: self._active < self.max_concurrent, timeout)
+                if not admitted:
+                    self.rejected_total += 1
+                    raise AdmissionRejected('queue timeout')
+                self._active += 1
+            finally:
+                self._waiting -= 1
+
+    def release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'active': self._active,
+                'waiting': self._waiting,
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'rejected_total': self.rejected_total,
+            }
@@ -0,0 +1,321 @@
+"""
+main.py detection servisi için mikro benchmark'lar.
+
+Kullanım:
+    python benchmarks.py perplexity --repeat 3 --batch-size 16
+    python benchmarks.py backends --backends fp32 int8 onnx --max-drift 0.05
+    python benchmarks.py segmenter --size 100000
+    python benchmarks.py serving --workers 1 2 4 --duration 30
+    python benchmarks.py reference-index --sizes 1000 10000 100000
+"""
+import argparse
+import json
+import multiprocessing
+import subprocess
+import threading
+import urllib.request
+import sys
+import time
+import logging
+import os
+import random
+import re
+import tempfile
+
+import numpy as np
+
+import main
+from reference_index import ReferenceIndex, normalize_rows
+
+# Sabit, tekrar üretilebilir Türkçe cümle kümesi
+BENCH_SENTENCES = main.AI_REFERENCE_TEXTS + main.HUMAN_REFERENCE_TEXTS + [
+    "Bugün hava çok güzeldi, sahilde uzun bir yürüyüş yaptık.",
+    "Toplantı ertelendi çünkü yöneticimiz şehir dışındaydı.",
+    "Yeni aldığım kitabı bir oturuşta bitirdim, sonu beklenmedikti.",
+    "Bu çalışmada önerilen yöntemin doğruluğu kapsamlı deneylerle doğrulanmıştır.",
+    "Sistem, yüksek ölçeklenebilirlik ve düşük gecikme süresi sağlayacak şekilde tasarlanmıştır.",
+]
+
+def timed(fn, repeat):
+    """fn'i repeat kez çalıştırır, (en iyi süre, son sonuç) döndürür."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def bench_perplexity(args):
+    main.load_models()
+    sentences = BENCH_SENTENCES * args.scale
+
+    loop_time, loop_ppl = timed(lambda: [
+        main.sentence_perplexity(s, main.hf_model_tr, main.hf_tokenizer_tr, main.device)
+        for s in sentences
+    ], args.repeat)
+    batch_time, batch_ppl = timed(lambda: main.batch_sentence_perplexities(
+        sentences, main.hf_model_tr, main.hf_tokenizer_tr, main.device, args.batch_size
+    ), args.repeat)
+
+    max_diff = float(np.max(np.abs(np.array(loop_ppl) - np.array(batch_ppl))))
+    print(f"sentences          : {len(sentences)}")
+    print(f"loop               : {loop_time:.3f}s ({len(sentences) / loop_time:.1f} sent/s)")
+    print(f"batched (bs={args.batch_size:<3})   : {batch_time:.3f}s ({len(sentences) / batch_time:.1f} sent/s)")
+    print(f"speedup            : {loop_time / batch_time:.2f}x")
+    print(f"max |ppl diff|     : {max_diff:.6f}")
+
+def current_rss_mb():
+    """Sürecin o anki resident set size'ı (MB, Linux /proc)"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        return float('nan')
+
+def run_backend(backend, sentences, batch_size, repeat):
+    """Tek backend'i temiz bir süreçte yükleyip skorlar (bellek ölçümü karışmasın)"""
+    import torch
+    from model_backends import load_causal_lm
+
+    logging.getLogger().setLevel(logging.WARNING)
+    device = torch.device("cpu")
+    rss_before = current_rss_mb()
+    load_start = time.perf_counter()
+    tokenizer = main.GPT2TokenizerFast.from_pretrained(main.MODEL_NAME_TR)
+    model = load_causal_lm(main.MODEL_NAME_TR, backend, device)
+    load_time = time.perf_counter() - load_start
+    elapsed, perplexities = timed(lambda: main.batch_sentence_perplexities(
+        sentences, model, tokenizer, device, batch_size
+    ), repeat)
+    return {
+        'backend': backend,
+        'load_s': load_time,
+        'score_s': elapsed,
+        'rss_mb': current_rss_mb() - rss_before,
+        'perplexities': perplexities,
+    }
+
+def bench_backends(args):
+    sentences = BENCH_SENTENCES * args.scale
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for backend in args.backends:
+        with context.Pool(1) as pool:
+            results[backend] = pool.apply(run_backend, (backend, sentences, args.batch_size, args.repeat))
+
+    reference = np.array(results['fp32']['perplexities']) if 'fp32' in results else None
+    print(f"{'backend':<8} {'load s':>8} {'score s':>8} {'sent/s':>8} {'RSS MB':>9} {'max drift':>10} {'mean drift':>11}")
+    failed = False
+    for backend, r in results.items():
+        line = (f"{backend:<8} {r['load_s']:>8.2f} {r['score_s']:>8.3f} "
+                f"{len(sentences) / r['score_s']:>8.1f} {r['rss_mb']:>9.0f}")
+        if reference is not None:
+            # fp32'ye göre cümle başına göreli perplexity sapması
+            drift = np.abs(np.array(r['perplexities']) - reference) / reference
+            line += f" {drift.max():>10.4f} {drift.mean():>11.4f}"
+            if drift.max() > args.max_drift:
+                failed = True
+        print(line)
+    if failed:
+        print(f"❌ drift above {args.max_drift} vs fp32")
+        sys.exit(1)
+
+# custom_sentence_tokenizer'ın önceki regex'i (eşdeğerlik ve süre karşılaştırması için)
+LEGACY_SENTENCE_PATTERN = re.compile(r'[^.!?\s][^.!?]*(?:[.!?](?![\'"]?\s|$)[^.!?]*)*[.!?]?[\'"]?(?=\s|$)')
+
+def legacy_sentence_tokenizer(text):
+    return [match.group(0).strip() for match in LEGACY_SENTENCE_PATTERN.finditer(text)]
+
+def adversarial_inputs(size):
+    """Nokta, tırnak ve boşluk ağırlıklı, geri izlemeyi zorlayan girdiler"""
+    rng = random.Random(0)
+    return {
+        'dots': '.' * size,
+        'dot-quote': ('."' * size)[:size],
+        'dot-quote-space': ('." ' * size)[:size],
+        'word-dot': ('a.' * size)[:size],
+        'no-terminator': ('kelime ' * size)[:size],
+        'random-punct': ''.join(rng.choice('.!?\'" a\n') for _ in range(size)),
+    }
+
+def bench_segmenter(args):
+    # Eşdeğerlik: sabit korpus + rastgele kısa girdiler
+    corpus = ['\n'.join(BENCH_SENTENCES), ' '.join(BENCH_SENTENCES)]
+    rng = random.Random(1)
+    corpus += [''.join(rng.choice('ab .!?\'"\n\t') for _ in range(rng.randint(0, 40))) for _ in range(args.samples)]
+    mismatches = [text for text in corpus if main.custom_sentence_tokenizer(text) != legacy_sentence_tokenizer(text)]
+    print(f"equivalence        : {len(corpus) - len(mismatches)}/{len(corpus)} identical")
+
+    print(f"{'input':<18} {'size':>8} {'segmenter ms':>13} {'legacy ms':>10}")
+    for name, text in adversarial_inputs(args.size).items():
+        new_time, _ = timed(lambda: main.custom_sentence_spans(text), args.repeat)
+        legacy_time, _ = timed(lambda: legacy_sentence_tokenizer(text), args.repeat)
+        print(f"{name:<18} {len(text):>8} {new_time * 1000:>13.2f} {legacy_time * 1000:>10.2f}")
+    if mismatches:
+        print(f"❌ first mismatch: {mismatches[0]!r}")
+        sys.exit(1)
+
+def process_tree_memory_mb(pid):
+    """Süreç ve doğrudan çocuklarının toplam RSS ve PSS'i (MB, Linux /proc)"""
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    rss = pss = 0
+    for p in pids:
+        try:
+            with open(f'/proc/{p}/smaps_rollup') as f:
+                for line in f:
+                    if line.startswith('Rss:'):
+                        rss += int(line.split()[1])
+                    elif line.startswith('Pss:'):
+                        pss += int(line.split()[1])
+        except OSError:
+            pass
+    return rss / 1024, pss / 1024, len(pids) - 1
+
+def post_json(url, payload, timeout=300):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode('utf-8'), headers={'Content-Type': 'application/json'}
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+def wait_until_healthy(url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=5):
+                return True
+        except OSError:
+            time.sleep(1)
+    return False
+
+def bench_serving(args):
+    """serve.py'yi farklı worker sayılarıyla başlatıp throughput ve bellek ölçer"""
+    text = "Başlık\n" + " ".join(BENCH_SENTENCES[:args.sentences])
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, RESULT_CACHE_ENABLED='0')  # cache isabetleri ölçümü bozmasın
+    print(f"{'workers':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>9} {'PSS MB':>9}")
+    for workers in args.workers:
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(base_dir, 'serve.py'), '--workers', str(workers), '--port', str(args.port)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            if not wait_until_healthy(f"{base_url}/api/health", args.startup_timeout):
+                print(f"{workers:>7} server did not become healthy")
+                continue
+            latencies = []
+            lock = threading.Lock()
+            stop_at = time.monotonic() + args.duration
+
+            def client():
+                while time.monotonic() < stop_at:
+                    start = time.perf_counter()
+                    post_json(f"{base_url}/api/detect", {'text': text})
+                    with lock:
+                        latencies.append(time.perf_counter() - start)
+
+            clients = [threading.Thread(target=client) for _ in range(args.concurrency)]
+            for t in clients:
+                t.start()
+            for t in clients:
+                t.join()
+            rss, pss, _ = process_tree_memory_mb(server.pid)
+            lat = np.array(latencies) * 1000
+            print(f"{workers:>7} {len(latencies) / args.duration:>8.2f} {np.percentile(lat, 50):>8.0f} "
+                  f"{np.percentile(lat, 99):>8.0f} {rss:>9.0f} {pss:>9.0f}")
+        finally:
+            server.terminate()
+            server.wait(30)
+
+def synthetic_references(size, dim, clusters, rng):
+    """Kümeli, normalize sentetik embedding'ler (gerçek korpus dağılımına yakın)"""
+    centers = normalize_rows(rng.standard_normal((clusters, dim)))
+    assignments = rng.integers(0, clusters, size)
+    noise = rng.standard_normal((size, dim)).astype(np.float32) * (2.0 / np.sqrt(dim))
+    return normalize_rows(centers[assignments] + noise), rng.integers(0, 2, size).astype(np.int8)
+
+def bench_reference_index(args):
+    rng = np.random.default_rng(0)
+    print(f"{'refs':>7} {'brute ms/q':>11} {'exact ms/q':>11} {'ivf train s':>12} {'ivf ms/q':>9} {'recall@k':>9}")
+    for size in args.sizes:
+        embeddings, labels = synthetic_references(size, args.dim, args.clusters, rng)
+        queries = normalize_rows(embeddings[rng.choice(size, args.queries)] +
+                                 rng.standard_normal((args.queries, args.dim)).astype(np.float32) * 0.02)
+        with tempfile.TemporaryDirectory() as path:
+            ReferenceIndex(embeddings, labels, 'bench').save(path)
+            index = ReferenceIndex.load(path)
+
+            # Eski yöntem: tüm referanslarla tek çarpım + tam sıralama
+            brute_time, _ = timed(lambda: np.argsort(-(queries @ embeddings.T), axis=1)[:, :args.k], args.repeat)
+            exact_time, (_, exact_rows, _) = timed(lambda: index.search(queries, args.k), args.repeat)
+            exact_ids = index.row_ids[exact_rows]
+
+            train_start = time.perf_counter()
+            index.train_ivf(args.n_lists or None)
+            train_time = time.perf_counter() - train_start
+            ivf_time, (_, ivf_rows, _) = timed(lambda: index.search(queries, args.k, nprobe=args.nprobe), args.repeat)
+            ivf_ids = index.row_ids[ivf_rows]
+
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(exact_ids, ivf_ids)])
+        per_query = 1000 / args.queries
+        print(f"{size:>7} {brute_time * per_query:>11.3f} {exact_time * per_query:>11.3f} {train_time:>12.2f} "
+              f"{ivf_time * per_query:>9.3f} {recall:>9.3f}")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="ai-content-tools detection benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("perplexity", help="Per-sentence loop vs padded batch perplexity")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--scale", type=int, default=4, help="Cümle kümesinin kaç kez tekrarlanacağı")
+    p.add_argument("--batch-size", type=int, default=main.DETECT_BATCH_SIZE)
+    p.set_defaults(func=bench_perplexity)
+
+    p = sub.add_parser("backends", help="Latency, memory and fp32 accuracy drift per backend")
+    p.add_argument("--backends", nargs="+", default=list(main.BACKENDS), choices=main.BACKENDS)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--scale", type=int, default=4)
+    p.add_argument("--batch-size", type=int, default=main.DETECT_BATCH_SIZE)
+    p.add_argument("--max-drift", type=float, default=0.05, help="fp32'ye göre izin verilen en büyük göreli sapma")
+    p.set_defaults(func=bench_backends)
+
+    p = sub.add_parser("segmenter", help="Sentence segmenter equivalence and adversarial-input runtime")
+    p.add_argument("--size", type=int, default=100000, help="Adversarial girdi uzunluğu (karakter)")
+    p.add_argument("--samples", type=int, default=20000)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_segmenter)
+
+    p = sub.add_parser("serving", help="serve.py throughput and resident memory per worker count")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--duration", type=float, default=30.0)
+    p.add_argument("--sentences", type=int, default=10, help="İstek başına cümle sayısı")
+    p.add_argument("--port", type=int, default=5101)
+    p.add_argument("--startup-timeout", type=float, default=600.0)
+    p.set_defaults(func=bench_serving)
+
+    p = sub.add_parser("reference-index", help="Reference kNN index: exact vs IVF latency and recall")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    p.add_argument("--dim", type=int, default=384, help="Embedding boyutu (MiniLM-L12: 384)")
+    p.add_argument("--clusters", type=int, default=256, help="Sentetik veri küme sayısı")
+    p.add_argument("--queries", type=int, default=64)
+    p.add_argument("--k", type=int, default=main.REFERENCE_KNN_K)
+    p.add_argument("--n-lists", type=int, default=0, help="IVF küme sayısı (0: 4·√n)")
+    p.add_argument("--nprobe", type=int, default=main.REFERENCE_IVF_NPROBE)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_reference_index)
+
+    return parser
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.WARNING)
+    args = build_parser().parse_args()
+    args.func(args)
@@ -0,0 +1,161 @@
+"""
+Detection servisi için hafif, bağımlılıksız metrik katmanı.
+
+Sayaçlar ve sabit bucket'lı histogramlar süreç içinde tutulur ve Prometheus
+metin formatında (/metrics) yazılır. Bir gözlem bir perf_counter farkı, bir
+bisect ve kısa bir kilitten ibarettir; üretimde açık bırakılabilir.
+"""
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Saniye cinsinden gecikme bucket'ları (100µs .. 60s)
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # bucket sayıları (son eleman +Inf), toplam, adet
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, buckets, labelnames=()):
+        metric = Histogram(name, documentation, buckets, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """
+        collector() -> [(name, type, documentation, [(labels_dict, value), ...])]
+        Yazım anında çağrılır; dış durumdan (cache, scheduler) değer okumak için.
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, metric_type, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    names = tuple(labels)
+                    lines.append(f"{name}{_format_labels(names, tuple(labels[n] for n in names))} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'detector_stage_seconds', 'Time spent per processing stage.', LATENCY_BUCKETS, ('stage',)
+)
+TOKENS_PROCESSED = REGISTRY.counter(
+    'detector_tokens_processed_total', 'Tokens run through a model forward pass.', ('model',)
+)
+BATCH_SIZE = REGISTRY.histogram(
+    'detector_batch_size', 'Number of sequences per model forward pass.', BATCH_SIZE_BUCKETS, ('model',)
+)
+REQUESTS = REGISTRY.counter(
+    'detector_requests_total', 'HTTP requests by endpoint and status code.', ('endpoint', 'status')
+)
+
+@contextmanager
+def stage(name):
+    """with stage('forward'): ... bloğunun süresini histograma yazar"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+
+def instrument(name):
+    """Fonksiyonun her çağrısını name aşaması olarak ölçen dekoratör"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+        return wrapper
+    return decorator
+
+def render():
+    return REGISTRY.render()
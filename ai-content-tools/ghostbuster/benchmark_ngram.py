@@ -0,0 +1,178 @@
+"""
+Build time and memory of the array-backed TrigramBackoff against the dict-based
+implementation it replaced, on the same token stream.
+
+Usage:
+    python benchmark_ngram.py --tokens 1200000
+    python benchmark_ngram.py --corpus brown --tokenizer davinci
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from collections import defaultdict, Counter
+
+import numpy as np
+
+from utils.n_gram import TrigramBackoff, get_tokenizer
+
+
+class LegacyNGramModel:
+    """
+    The dict-based n-gram model, kept here as the benchmark baseline
+    """
+
+    def __init__(self, train_text, n=2, alpha=3e-3):
+        self.n = n
+        self.vocab_size = 50257
+
+        self.smoothing = alpha
+        self.smoothing_f = alpha * self.vocab_size
+
+        self.c = defaultdict(lambda: [0, Counter()])
+        for i in range(len(train_text) - n):
+            n_gram = tuple(train_text[i : i + n])
+            self.c[n_gram[:-1]][1][n_gram[-1]] += 1
+            self.c[n_gram[:-1]][0] += 1
+        self.n_size = len(self.c)
+
+    def n_gram_probability(self, n_gram):
+        it = self.c[tuple(n_gram[:-1])]
+        return (it[1][n_gram[-1]] + self.smoothing) / (it[0] + self.smoothing_f)
+
+
+class LegacyDiscountBackoffModel(LegacyNGramModel):
+    def __init__(self, train_text, lower_order_model, n=2, delta=0.9):
+        super().__init__(train_text, n=n)
+        self.lower_order_model = lower_order_model
+        self.discount = delta
+
+    def n_gram_probability(self, n_gram):
+        it = self.c[tuple(n_gram[:-1])]
+
+        if it[0] == 0:
+            return self.lower_order_model.n_gram_probability(n_gram[1:])
+
+        prob = self.discount * \
+            (len(it[1])/it[0]) * \
+            self.lower_order_model.n_gram_probability(n_gram[1:])
+        if it[1][n_gram[-1]] != 0:
+            prob += max(it[1][n_gram[-1]] - self.discount, 0) / it[0]
+
+        return prob
+
+
+class LegacyKneserNeyBaseModel(LegacyNGramModel):
+    def __init__(self, train_text):
+        super().__init__(train_text, n=1)
+
+        base_cnt = defaultdict(set)
+        for i in range(1, len(train_text)):
+            base_cnt[train_text[i]].add(train_text[i - 1])
+
+        cnt = sum(len(predecessors) for predecessors in base_cnt.values())
+        self.prob = defaultdict(float)
+        for word in base_cnt:
+            self.prob[word] = len(base_cnt[word]) / cnt
+
+    def n_gram_probability(self, n_gram):
+        ret_prob = self.prob[n_gram[0]]
+        return 1 / self.vocab_size if ret_prob == 0 else ret_prob
+
+
+class LegacyTrigramBackoff:
+    def __init__(self, train_text, delta=0.9):
+        self.base = LegacyKneserNeyBaseModel(train_text)
+        self.bigram = LegacyDiscountBackoffModel(
+            train_text, self.base, n=2, delta=delta)
+        self.trigram = LegacyDiscountBackoffModel(
+            train_text, self.bigram, n=3, delta=delta)
+
+    def n_gram_probability(self, n_gram):
+        return self.trigram.n_gram_probability(n_gram)
+
+
+def zipf_corpus(size, vocab_size, seed):
+    """
+    Returns a reproducible Zipfian token stream, a stand-in for a tokenized corpus
+    """
+    rng = np.random.default_rng(seed)
+    tokens = rng.zipf(1.2, size) % vocab_size
+    return tokens.tolist()
+
+
+def brown_corpus(tokenizer):
+    from nltk.corpus import brown
+
+    encode = get_tokenizer(tokenizer)
+    tokens = []
+    for sentence in brown.sents():
+        tokens += encode(" ".join(sentence))
+    return tokens
+
+
+def measure(build, tokens):
+    """
+    Returns (build seconds, retained MB, peak MB) of build(tokens). Time and
+    memory come from separate builds, since tracemalloc slows allocation down.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    model = build(tokens)
+    seconds = time.perf_counter() - start
+    del model
+
+    gc.collect()
+    tracemalloc.start()
+    model = build(tokens)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del model
+    return seconds, retained / 2**20, peak / 2**20
+
+
+def max_difference(tokens, num_queries, seed):
+    """
+    Returns the largest difference between the two models on seen and unseen
+    trigrams, including the 50256 padding prefix used by score_ngram
+    """
+    legacy, model = LegacyTrigramBackoff(tokens), TrigramBackoff(tokens)
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(0, len(tokens) - 2, num_queries)
+    queries = [tuple(tokens[i : i + 3]) for i in starts]
+    queries += [tuple(t) for t in rng.integers(0, 50257, (num_queries, 3)).tolist()]
+    queries += [(50256, 50256, tokens[0]), (50256, tokens[0], tokens[1])]
+
+    expected = np.array([legacy.n_gram_probability(q) for q in queries])
+    actual = np.array([model.n_gram_probability(q) for q in queries])
+    return np.abs(expected - actual).max(), len(queries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build time and memory of the array vs dict trigram models"
+    )
+    parser.add_argument("--corpus", default="zipf", choices=["zipf", "brown"])
+    parser.add_argument("--tokens", type=int, default=1_200_000, help="zipf only")
+    parser.add_argument("--vocab_size", type=int, default=50257, help="zipf only")
+    parser.add_argument(
+        "--tokenizer", default="davinci", choices=["davinci", "llama-2-7b"]
+    )
+    parser.add_argument("--queries", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.corpus == "brown":
+        tokens = brown_corpus(args.tokenizer)
+    else:
+        tokens = zipf_corpus(args.tokens, args.vocab_size, args.seed)
+    print(f"corpus: {args.corpus}, {len(tokens)} tokens")
+
+    print(f"{'model':<8} {'build s':>9} {'retained MB':>12} {'peak MB':>9}")
+    for name, build in (("dict", LegacyTrigramBackoff), ("array", TrigramBackoff)):
+        seconds, retained, peak = measure(build, tokens)
+        print(f"{name:<8} {seconds:>9.2f} {retained:>12.1f} {peak:>9.1f}")
+
+    difference, num_queries = max_difference(tokens, args.queries, args.seed)
+    print(f"max |p diff| over {num_queries} trigrams: {difference:.3g}")
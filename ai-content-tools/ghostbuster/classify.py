@@ -6,7 +6,8 @@ import argparse
 
 from sklearn.linear_model import LogisticRegression
 from utils.featurize import normalize, t_featurize_logprobs, score_ngram
-from utils.symbolic import train_trigram, get_words, vec_functions, scalar_functions
+from utils.symbolic import get_words, vec_functions, scalar_functions
+from utils.n_gram import load_trigram, default_trigram_path
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--file", type=str, default="input.txt")
@@ -37,10 +38,10 @@ with open(file) as f:
 
     print(f"Input: {doc}")
 
-# Train trigram
+# Load trigram
 print("Loading Trigram...")
 
-trigram_model = train_trigram()
+trigram_model = load_trigram(default_trigram_path("davinci"), tokenizer="davinci")
 
 trigram = np.array(score_ngram(doc, trigram_model, enc.encode, n=3, strip_first=False))
 unigram = np.array(score_ngram(doc, trigram_model.base, enc.encode, n=1, strip_first=False))
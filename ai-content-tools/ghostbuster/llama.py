@@ -3,7 +3,7 @@ import argparse
 
 from utils.featurize import convert_file_to_logprob_file, get_logprobs
 from utils.load import Dataset, get_generate_dataset
-from utils.n_gram import TrigramBackoff
+from utils.n_gram import load_trigram, default_trigram_path
 from utils.featurize import select_features, normalize
 from utils.symbolic import vec_functions, scalar_functions
 
@@ -15,8 +15,6 @@ import tqdm
 import numpy as np
 import dill as pickle
 
-from nltk.util import ngrams
-from nltk.corpus import brown
 from nltk.tokenize import word_tokenize
 
 from sklearn.linear_model import LogisticRegression
@@ -58,14 +56,7 @@ parser.add_argument("--classify", action="store_true")
 args = parser.parse_args()
 tokenizer = AutoTokenizer.from_pretrained("meta-llama/Llama-2-7b-hf")
 
-sentences = brown.sents()
-
-tokenized_corpus = []
-for sentence in tqdm.tqdm(sentences):
-    tokens = tokenizer(" ".join(sentence))["input_ids"]
-    tokenized_corpus += tokens
-
-trigram = TrigramBackoff(tokenized_corpus)
+trigram = load_trigram(default_trigram_path("llama-2-7b"), tokenizer="llama-2-7b")
 
 
 vec_combinations = defaultdict(list)
@@ -120,15 +111,10 @@ def score_ngram(doc, model, tokenizer, n=3):
     """
     Returns vector of ngram probabilities given document, model and tokenizer
     """
-    scores = []
     tokens = (
         tokenizer(doc.strip())[1:] if n == 1 else (n - 2) * [2] + tokenizer(doc.strip())
     )
-
-    for i in ngrams(tokens, n):
-        scores.append(model.n_gram_probability(i))
-
-    return np.array(scores)
+    return model.n_gram_probabilities(tokens)
 
 
 def get_all_logprobs(
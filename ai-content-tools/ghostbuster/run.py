@@ -30,6 +30,7 @@ from sklearn.calibration import CalibratedClassifierCV
 from utils.featurize import normalize, t_featurize, select_features
 from utils.symbolic import get_all_logprobs, get_exp_featurize, backtrack_functions
 from utils.load import Dataset, get_generate_dataset
+from utils.n_gram import load_trigram, default_trigram_path
 
 from generate import perturb_char_names, perturb_char_sizes
 from generate import perturb_sent_names, perturb_sent_sizes
@@ -53,9 +54,7 @@ for file in os.listdir("results"):
             best_features_map[file[:-4]] = f.read().strip().split("\n")
 
 print("Loading trigram model...")
-trigram_model = pickle.load(
-    open("model/trigram_model.pkl", "rb"), pickle.HIGHEST_PROTOCOL
-)
+trigram_model = load_trigram(default_trigram_path("davinci"), tokenizer="davinci")
 tokenizer = tiktoken.encoding_for_model("davinci").encode
 
 print("Loading features...")
@@ -0,0 +1,182 @@
+"""
+Golden values for the handcrafted features. T_FEATURES, CONVOLVE_30_7 and the
+get_token_len values were frozen from the loop/sort based implementations that
+the vectorized versions replaced. T_FEATURES_FILES were frozen from the current
+float32 file path, so they only guard against regressions from here on.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from utils.featurize import (
+    convolve,
+    get_logprobs,
+    get_token_len,
+    pad_vectors,
+    read_logprob_file,
+    t_featurize,
+    t_featurize_batch,
+    t_featurize_logprobs,
+    t_featurize_logprobs_batch,
+)
+from utils.logprob_store import LogprobStore
+
+
+def make_doc(n):
+    i = np.arange(n)
+    davinci = 5 * np.abs(np.sin(i * 0.7))
+    ada = 4 * np.abs(np.cos(i * 1.3))
+    tokens = ["Ġw" if k % 3 == 0 or k % 7 == 0 else "s" for k in range(n)]
+    return davinci, ada, tokens
+
+
+T_FEATURES = {
+    0: [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+    10: [6.0, 0.9956343613570534, 0.0, 0.09524232870351758, 0.0, 0.36, 0.0],
+    300: [
+        177.0,
+        4.199213375890686,
+        4.410087387459162,
+        4.05071802634701,
+        0.32368295441143563,
+        3.0,
+        2.1553398058252426,
+    ],
+}
+
+# t_featurize on logprob files holding the davinci/ada values of make_doc, read
+# as float32 probabilities; frozen from the vectorized implementation
+T_FEATURES_FILES = {
+    (10, 2048): [0.0, 0.0, 0.0, 0.030853067189455033, 0.0, 0.36, 0.0],
+    (300, 2048): [
+        0.0,
+        0.0,
+        0.0,
+        0.6201242208480835,
+        -0.09488808363676071,
+        3.0,
+        2.1553398058252426,
+    ],
+    (300, 64): [0.0, 0.0, 0.0, 0.26022881269454956, -0.1881210058927536, 2.44, 0.08],
+}
+
+CONVOLVE_30_7 = [
+    0.6495530418761907,
+    0.7728686656831726,
+    0.8271462333817169,
+    0.8075372915015447,
+    0.7157934484204569,
+    0.5601099084046748,
+    0.35439341841911676,
+    0.11702001983880686,
+    -0.1308064285986877,
+    -0.366948328343866,
+    -0.5703118267823905,
+    -0.7227310682663332,
+    -0.8105908958967245,
+    -0.8260430529399797,
+    -0.7677072442278299,
+    -0.6407944338138388,
+    -0.45664136507405667,
+    -0.2316978831849081,
+    0.013942480554646959,
+    0.258337404030465,
+    0.4796558165979282,
+    0.6581280036042157,
+    0.7778115761190628,
+]
+
+
+@pytest.mark.parametrize("n", [0, 10, 300])
+def test_t_featurize_logprobs(n):
+    np.testing.assert_allclose(
+        t_featurize_logprobs(*make_doc(n)), T_FEATURES[n], rtol=1e-9
+    )
+
+
+def test_t_featurize_logprobs_batch():
+    docs = [make_doc(n) for n in (300, 0, 10)]
+    davinci, lengths = pad_vectors([d for d, _, _ in docs])
+    ada, _ = pad_vectors([a for _, a, _ in docs], width=davinci.shape[1])
+    features = t_featurize_logprobs_batch(
+        davinci, ada, lengths, [t for _, _, t in docs]
+    )
+    expected = [T_FEATURES[300], T_FEATURES[0], T_FEATURES[10]]
+    np.testing.assert_allclose(features, expected, rtol=1e-9)
+
+
+@pytest.fixture
+def logprob_files(tmp_path):
+    (tmp_path / "logprobs").mkdir()
+    for n in (10, 300):
+        davinci, ada, tokens = make_doc(n)
+        (tmp_path / f"doc{n}.txt").write_text("x")
+        for model, values in (("davinci", davinci), ("ada", ada)):
+            lines = [f"{t} {float(v)!r}" for t, v in zip(tokens, values)]
+            (tmp_path / "logprobs" / f"doc{n}-{model}.txt").write_text(
+                "\n".join(lines) + "\n"
+            )
+    return {n: str(tmp_path / f"doc{n}.txt") for n in (10, 300)}
+
+
+@pytest.mark.parametrize("n, num_tokens", list(T_FEATURES_FILES))
+def test_t_featurize(logprob_files, n, num_tokens):
+    features = t_featurize(logprob_files[n], num_tokens=num_tokens)
+    np.testing.assert_allclose(features, T_FEATURES_FILES[(n, num_tokens)], rtol=1e-6)
+
+
+def test_t_featurize_batch(logprob_files):
+    features = t_featurize_batch([logprob_files[300], logprob_files[10]], num_tokens=64)
+    expected = [T_FEATURES_FILES[(300, 64)], T_FEATURES_FILES[(10, 2048)]]
+    np.testing.assert_allclose(features, expected, rtol=1e-6)
+
+
+def test_stale_packed_store(logprob_files, tmp_path):
+    logprob_dir = str(tmp_path / "logprobs")
+    file = os.path.join(logprob_dir, "doc10-davinci.txt")
+    LogprobStore.build(logprob_dir, verbose=False)
+    np.testing.assert_allclose(get_logprobs(file), np.exp(-make_doc(10)[0]), rtol=1e-6)
+
+    # A regenerated text file wins over the packed copy
+    with open(file, "w") as f:
+        f.write("Ġa 1.0\nb 2.0\n")
+    os.utime(file, ns=(0, 0))
+    with pytest.warns(UserWarning, match="changed since"):
+        tokens, probs = read_logprob_file(file)
+    assert list(tokens) == ["Ġa", "b"]
+    np.testing.assert_allclose(probs, np.exp([-1.0, -2.0]), rtol=1e-6)
+
+
+def test_get_token_len():
+    assert get_token_len([]).tolist() == []
+    assert get_token_len(make_doc(10)[2]).tolist() == [0, 3, 3, 1, 2]
+    token_len = get_token_len(make_doc(300)[2])
+    assert token_len[:12].tolist() == [0, 3, 3, 1, 2, 3, 2, 1, 3, 3, 3, 3]
+    assert (len(token_len), token_len.sum()) == (128, 297)
+
+
+@pytest.mark.parametrize("n, window", [(0, 7), (5, 7), (7, 7)])
+def test_convolve_shorter_than_window(n, window):
+    assert len(convolve(np.sin(np.arange(n) * 0.3), window=window)) == 0
+
+
+def test_convolve():
+    np.testing.assert_allclose(
+        convolve(np.sin(np.arange(30) * 0.3), window=7), CONVOLVE_30_7, rtol=1e-9
+    )
+
+    running = convolve(np.sin(np.arange(250) * 0.3))
+    assert len(running) == 150
+    np.testing.assert_allclose(
+        running[:3],
+        [0.03292002148315852, 0.023039705242229896, 0.011101320750042932],
+        rtol=1e-9,
+    )
+    np.testing.assert_allclose(
+        running[-3:],
+        [0.029350358228438872, 0.018545230563752905, 0.006083512685162309],
+        rtol=1e-9,
+    )
+    assert running.mean() == pytest.approx(0.00045267908589133137, rel=1e-9)
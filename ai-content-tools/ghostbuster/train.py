@@ -11,18 +11,17 @@ from sklearn.calibration import CalibratedClassifierCV
 from tabulate import tabulate
 
 from utils.featurize import normalize, t_featurize, select_features
-from utils.symbolic import get_all_logprobs, train_trigram, get_exp_featurize
+from utils.symbolic import get_all_logprobs, get_exp_featurize, get_exp_featurize_batch
 from utils.symbolic import generate_symbolic_data
 from utils.load import get_generate_dataset, Dataset
+from utils.n_gram import load_trigram, default_trigram_path
 
 
 with open("results/best_features_four.txt") as f:
     best_features = f.read().strip().split("\n")
 
 print("Loading trigram model...")
-trigram_model = pickle.load(
-    open("model/trigram_model.pkl", "rb"), pickle.HIGHEST_PROTOCOL
-)
+trigram_model = load_trigram(default_trigram_path("davinci"), tokenizer="davinci")
 tokenizer = tiktoken.encoding_for_model("davinci").encode
 
 wp_dataset = [
@@ -59,7 +58,7 @@ eval_dataset = [
 ]
 
 
-def get_featurized_data(generate_dataset_fn, best_features):
+def get_featurized_data(generate_dataset_fn, best_features, batch=False):
     t_data = generate_dataset_fn(t_featurize)
 
     davinci, ada, trigram, unigram = get_all_logprobs(
@@ -72,8 +71,12 @@ def get_featurized_data(generate_dataset_fn, best_features):
         "trigram-logprobs": lambda file: trigram[file],
         "unigram-logprobs": lambda file: unigram[file],
     }
-    exp_featurize = get_exp_featurize(best_features, vector_map)
-    exp_data = generate_dataset_fn(exp_featurize)
+    if batch:
+        exp_featurize = get_exp_featurize_batch(best_features, vector_map)
+        exp_data = exp_featurize(generate_dataset_fn(lambda file: file))
+    else:
+        exp_featurize = get_exp_featurize(best_features, vector_map)
+        exp_data = generate_dataset_fn(exp_featurize)
 
     return np.concatenate([t_data, exp_data], axis=1)
 
@@ -83,6 +86,11 @@ if __name__ == "__main__":
     parser.add_argument("--generate_symbolic_data", action="store_true")
     parser.add_argument("--generate_symbolic_data_four", action="store_true")
     parser.add_argument("--generate_symbolic_data_eval", action="store_true")
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Compute symbolic features over all documents at once (float32)",
+    )
 
     parser.add_argument("--perform_feature_selection", action="store_true")
     parser.add_argument("--perform_feature_selection_one", action="store_true")
@@ -115,6 +123,9 @@ if __name__ == "__main__":
             max_depth=3,
             output_file="symbolic_data_gpt",
             verbose=True,
+            trigram=trigram_model,
+            tokenizer=tokenizer,
+            batch=args.batch,
         )
 
         t_data = generate_dataset_fn(t_featurize)
@@ -127,6 +138,9 @@ if __name__ == "__main__":
             max_depth=3,
             output_file="symbolic_data_eval",
             verbose=True,
+            trigram=trigram_model,
+            tokenizer=tokenizer,
+            batch=args.batch,
         )
 
         t_data_eval = generate_dataset_fn_eval(t_featurize)
@@ -138,6 +152,9 @@ if __name__ == "__main__":
             max_depth=4,
             output_file="symbolic_data_gpt_four",
             verbose=True,
+            trigram=trigram_model,
+            tokenizer=tokenizer,
+            batch=args.batch,
         )
 
         t_data = generate_dataset_fn(t_featurize)
@@ -277,7 +294,8 @@ if __name__ == "__main__":
                 f.write(feat + "\n")
 
     data, mu, sigma = normalize(
-        get_featurized_data(generate_dataset_fn, best_features), ret_mu_sigma=True
+        get_featurized_data(generate_dataset_fn, best_features, batch=args.batch),
+        ret_mu_sigma=True,
     )
     print(f"Best Features: {best_features}")
     print(f"Data Shape: {data.shape}")
@@ -1,48 +1,64 @@
 import numpy as np
 import os
 import tqdm
-from nltk import ngrams
+import warnings
+from functools import lru_cache
 from utils.score import k_fold_score
+from utils.logprob_store import open_store, parse_logprob_file
 
 
-def get_logprobs(file):
+# Number of parsed logprob files kept in memory (davinci + ada for ~2k documents)
+LOGPROB_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=LOGPROB_CACHE_SIZE)
+def _read_logprob_file(path, mtime):
+    tokens, probs = parse_logprob_file(path)
+    probs.flags.writeable = False
+    return tuple(tokens), probs
+
+
+def read_logprob_file(file):
     """
-    Returns a vector containing all the logprobs from a given logprobs file
+    Returns (tokens, logprobs) from a given logprobs file, where logprobs are the
+    token probabilities exp(-logprob). Reads from the packed store when one exists
+    and is current, otherwise parses the file once and caches it by path and
+    modification time.
     """
-    logprobs = []
+    stat = os.stat(file)
+    store = open_store(os.path.dirname(file))
+    if store is not None:
+        hit = store.lookup(file, stat)
+        if hit is not None:
+            return store.get_tokens(*hit), store.get_logprobs(*hit)
+        if store.lookup(file) is not None:
+            warnings.warn(
+                f"{file} changed since its packed store was built, reading the text "
+                "file instead; rebuild the store with python -m utils.logprob_store"
+            )
+    return _read_logprob_file(os.path.abspath(file), stat.st_mtime_ns)
 
-    with open(file) as f:
-        for line in f.read().strip().split("\n"):
-            line = line.split(" ")
-            logprobs.append(np.exp(-float(line[1])))
 
-    return np.array(logprobs)
+def get_logprobs(file):
+    """
+    Returns a vector containing all the logprobs from a given logprobs file
+    """
+    return read_logprob_file(file)[1]
 
 
 def get_tokens(file):
     """
     Returns a list of all tokens from a given logprobs file
     """
-    with open(file) as f:
-        tokens = list(map(lambda x: x.split(" ")[0], f.read().strip().split("\n")))
-    return tokens
+    return list(read_logprob_file(file)[0])
 
 
 def get_token_len(tokens):
     """
     Returns a vector of word lengths, in tokens
     """
-    tokens_len = []
-    curr = 0
-
-    for token in tokens:
-        if token[0] == "Ġ":
-            tokens_len.append(curr)
-            curr = 1
-        else:
-            curr += 1
-
-    return np.array(tokens_len)
+    starts = np.flatnonzero([token.startswith("Ġ") for token in tokens])
+    return np.diff(starts, prepend=0)
 
 
 def get_diff(file1, file2):
@@ -56,23 +72,19 @@ def convolve(X, window=100):
     """
     Returns a vector of running average with window size
     """
-    ret = []
-    for i in range(len(X) - window):
-        ret.append(np.mean(X[i : i + window]))
-    return np.array(ret)
+    if len(X) <= window:
+        return np.array([])
+    sums = np.cumsum(np.concatenate([[0.0], X]))
+    return (sums[window:-1] - sums[: -window - 1]) / window
 
 
 def score_ngram(doc, model, tokenizer, n=3, strip_first=False):
     """
     Returns vector of ngram probabilities given document, model and tokenizer
     """
-    scores = []
     if strip_first:
         doc = " ".join(doc.split()[:1000])
-    for i in ngrams((n - 1) * [50256] + tokenizer(doc.strip()), n):
-        scores.append(model.n_gram_probability(i))
-
-    return np.array(scores)
+    return model.n_gram_probabilities((n - 1) * [50256] + tokenizer(doc.strip()))
 
 
 def normalize(data, mu=None, sigma=None, ret_mu_sigma=False):
@@ -110,30 +122,81 @@ def convert_file_to_logprob_file(file_name, model):
     return logprob_file_path
 
 
-def t_featurize_logprobs(davinci_logprobs, ada_logprobs, tokens):
-    X = []
+def pad_vectors(vectors, width=None, fill=0.0, dtype=np.float64):
+    """
+    Stacks ragged vectors into a (len(vectors), width) matrix padded with fill.
+    Returns the matrix and a vector with the original lengths.
+    """
+    lengths = np.array([len(v) for v in vectors], dtype=np.int64)
+    width = int(lengths.max(initial=0)) if width is None else width
+    matrix = np.full((len(vectors), width), fill, dtype=dtype)
+    for row, v in enumerate(vectors):
+        matrix[row, : min(len(v), width)] = v[:width]
+    return matrix, np.minimum(lengths, width)
 
-    outliers = []
-    for logprob in davinci_logprobs:
-        if logprob > 3:
-            outliers.append(logprob)
 
-    X.append(len(outliers))
-    outliers += [0] * (50 - len(outliers))
-    X.append(np.mean(outliers[:25]))
-    X.append(np.mean(outliers[25:50]))
+def top_k_sums(values, lengths, k=25):
+    """
+    Returns the row-wise sum of the k largest valid entries of a padded matrix and
+    the sum of the remaining valid entries
+    """
+    width = max(values.shape[1], k)
+    valid = np.arange(width) < lengths[:, None]
+    padded = np.full((len(values), width), -np.inf)
+    padded[:, : values.shape[1]] = values
+    padded[~valid] = -np.inf
 
-    diffs = sorted(davinci_logprobs - ada_logprobs, reverse=True)
-    diffs += [0] * (50 - min(50, len(diffs)))
-    X.append(np.mean(diffs[:25]))
-    X.append(np.mean(diffs[25:]))
+    part = np.partition(padded, width - k, axis=1)
+    part[np.isinf(part)] = 0
+    top = part[:, width - k :].sum(axis=1)
+    return top, part[:, : width - k].sum(axis=1)
 
-    token_len = sorted(get_token_len(tokens), reverse=True)
-    token_len += [0] * (50 - min(50, len(token_len)))
-    X.append(np.mean(token_len[:25]))
-    X.append(np.mean(token_len[25:]))
 
-    return X
+def t_featurize_logprobs_batch(davinci_logprobs, ada_logprobs, lengths, tokens):
+    """
+    Batch version of t_featurize_logprobs. davinci_logprobs and ada_logprobs are
+    (docs x tokens) matrices padded past lengths, tokens is a list of token lists.
+    Returns a (docs x 7) feature matrix.
+    """
+    davinci_logprobs = np.asarray(davinci_logprobs, dtype=np.float64)
+    ada_logprobs = np.asarray(ada_logprobs, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    valid = np.arange(davinci_logprobs.shape[1]) < lengths[:, None]
+
+    # Outliers are kept in document order: the first 25 and the next 25, zero padded
+    outliers = (davinci_logprobs > 3) & valid
+    rank = np.cumsum(outliers, axis=1)
+    outlier_values = np.where(outliers, davinci_logprobs, 0)
+    first = (outlier_values * (rank <= 25)).sum(axis=1)
+    second = (outlier_values * ((rank > 25) & (rank <= 50))).sum(axis=1)
+
+    # Top 25 and the rest, where a list shorter than 50 is padded with zeros
+    diff_top, diff_rest = top_k_sums(davinci_logprobs - ada_logprobs, lengths)
+
+    token_len, num_words = pad_vectors([get_token_len(t) for t in tokens])
+    len_top, len_rest = top_k_sums(token_len, num_words)
+
+    return np.stack(
+        [
+            outliers.sum(axis=1),
+            first / 25,
+            second / 25,
+            diff_top / 25,
+            diff_rest / np.maximum(lengths - 25, 25),
+            len_top / 25,
+            len_rest / np.maximum(num_words - 25, 25),
+        ],
+        axis=1,
+    )
+
+
+def t_featurize_logprobs(davinci_logprobs, ada_logprobs, tokens):
+    return t_featurize_logprobs_batch(
+        np.asarray(davinci_logprobs)[None],
+        np.asarray(ada_logprobs)[None],
+        [len(davinci_logprobs)],
+        [tokens],
+    )[0].tolist()
 
 
 def t_featurize(file, num_tokens=2048):
@@ -143,13 +206,32 @@ def t_featurize(file, num_tokens=2048):
     davinci_file = convert_file_to_logprob_file(file, "davinci")
     ada_file = convert_file_to_logprob_file(file, "ada")
 
-    davinci_logprobs = get_logprobs(davinci_file)[:num_tokens]
+    davinci_tokens, davinci_logprobs = read_logprob_file(davinci_file)
     ada_logprobs = get_logprobs(ada_file)[:num_tokens]
-    tokens = get_tokens(davinci_file)[:num_tokens]
+    davinci_logprobs = davinci_logprobs[:num_tokens]
+    tokens = list(davinci_tokens[:num_tokens])
 
     return t_featurize_logprobs(davinci_logprobs, ada_logprobs, tokens)
 
 
+def t_featurize_batch(files, num_tokens=2048):
+    """
+    Batch version of t_featurize, returns a (len(files) x 7) feature matrix
+    """
+    davinci, ada, tokens = [], [], []
+    for file in files:
+        davinci_tokens, davinci_logprobs = read_logprob_file(
+            convert_file_to_logprob_file(file, "davinci")
+        )
+        davinci.append(davinci_logprobs[:num_tokens])
+        ada.append(get_logprobs(convert_file_to_logprob_file(file, "ada"))[:num_tokens])
+        tokens.append(davinci_tokens[:num_tokens])
+
+    davinci, lengths = pad_vectors(davinci)
+    ada, _ = pad_vectors(ada, width=davinci.shape[1])
+    return t_featurize_logprobs_batch(davinci, ada, lengths, tokens)
+
+
 def select_features(exp_to_data, labels, verbose=True, to_normalize=True, indices=None):
     if to_normalize:
         normalized_exp_to_data = {}
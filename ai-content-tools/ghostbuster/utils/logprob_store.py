@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+import tqdm
+
+STORE_DIR = "packed"
+DEFAULT_MODELS = ("davinci", "ada")
+
+
+def parse_logprob_file(file):
+    """
+    Parses a logprobs file in a single pass into a list of tokens and a float32
+    vector of token probabilities, exp(-logprob)
+    """
+    with open(file) as f:
+        lines = f.read().strip().split("\n")
+    pairs = [line.split(" ", 2) for line in lines]
+    tokens = [pair[0] for pair in pairs]
+    values = np.array([pair[1] for pair in pairs], dtype=np.float64)
+    return tokens, np.exp(-values).astype(np.float32)
+
+
+def _save(path, array):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class LogprobStore:
+    """
+    Packed, memory-mapped version of a logprobs folder. For every model there is one
+    float32 array of token probabilities, one int32 array of token ids and an int64
+    offsets index, so document i spans [offsets[i], offsets[i + 1]). The index also
+    records the (mtime, size) of every source file, so stale documents are skipped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "index.json")) as f:
+            index = json.load(f)
+        self.vocab = np.array(index["vocab"], dtype=object)
+        self.documents = {
+            model: {name: row for row, name in enumerate(names)}
+            for model, names in index["documents"].items()
+        }
+        # Stores built before sources were recorded are treated as stale
+        self.sources = {
+            model: [tuple(source) for source in sources]
+            for model, sources in index.get("sources", {}).items()
+        }
+        self._arrays = {}
+
+    def _model_arrays(self, model):
+        if model not in self._arrays:
+            # np.asarray drops the memmap subclass but keeps the mapping
+            load = lambda kind: np.asarray(
+                np.load(os.path.join(self.path, f"{model}-{kind}.npy"), mmap_mode="r")
+            )
+            self._arrays[model] = (load("offsets"), load("probs"), load("tokens"))
+        return self._arrays[model]
+
+    def lookup(self, file, stat=None):
+        """
+        Returns (name, model) if the logprobs file is in the store, otherwise None.
+        If stat (an os.stat_result of file) is given, also returns None when the
+        file was modified since the store was built.
+        """
+        base_name = os.path.splitext(os.path.basename(file))[0]
+        for model, names in self.documents.items():
+            suffix = f"-{model}"
+            name = base_name[: -len(suffix)]
+            if not base_name.endswith(suffix) or name not in names:
+                continue
+            if stat is not None and not self.is_current(name, model, stat):
+                return None
+            return name, model
+        return None
+
+    def is_current(self, name, model, stat):
+        """
+        Returns whether a document matches the (mtime, size) of its source file
+        """
+        sources = self.sources.get(model)
+        if sources is None:
+            return False
+        return sources[self.documents[model][name]] == (stat.st_mtime_ns, stat.st_size)
+
+    def _span(self, name, model):
+        offsets, probs, token_ids = self._model_arrays(model)
+        row = self.documents[model][name]
+        return slice(offsets[row], offsets[row + 1]), probs, token_ids
+
+    def get_logprobs(self, name, model):
+        """
+        Returns the token probabilities of a document, exp(-logprob), as a float32 view
+        """
+        span, probs, _ = self._span(name, model)
+        return probs[span]
+
+    def get_token_ids(self, name, model):
+        span, _, token_ids = self._span(name, model)
+        return token_ids[span]
+
+    def get_tokens(self, name, model):
+        return self.vocab[self.get_token_ids(name, model)].tolist()
+
+    @staticmethod
+    def build(logprob_dir, models=DEFAULT_MODELS, verbose=True):
+        """
+        Converts every {name}-{model}.txt file in logprob_dir into a packed store
+        at logprob_dir/packed and returns it
+        """
+        path = os.path.join(logprob_dir, STORE_DIR)
+        os.makedirs(path, exist_ok=True)
+
+        vocab, vocab_ids = [], {}
+        documents, sources = {}, {}
+        files = sorted(f for f in os.listdir(logprob_dir) if f.endswith(".txt"))
+
+        for model in models:
+            suffix = f"-{model}.txt"
+            names = [f[: -len(suffix)] for f in files if f.endswith(suffix)]
+            if not names:
+                continue
+
+            offsets = [0]
+            probs, token_ids, model_sources = [], [], []
+            for name in tqdm.tqdm(names, desc=model) if verbose else names:
+                file = os.path.join(logprob_dir, f"{name}{suffix}")
+                # Stat before parsing, so a file rewritten meanwhile reads as stale
+                stat = os.stat(file)
+                model_sources.append((stat.st_mtime_ns, stat.st_size))
+                tokens, doc_probs = parse_logprob_file(file)
+                for token in tokens:
+                    if token not in vocab_ids:
+                        vocab_ids[token] = len(vocab)
+                        vocab.append(token)
+                probs.append(doc_probs)
+                token_ids.append(
+                    np.array([vocab_ids[t] for t in tokens], dtype=np.int32)
+                )
+                offsets.append(offsets[-1] + len(tokens))
+
+            _save(
+                os.path.join(path, f"{model}-offsets.npy"),
+                np.array(offsets, dtype=np.int64),
+            )
+            _save(os.path.join(path, f"{model}-probs.npy"), np.concatenate(probs))
+            _save(os.path.join(path, f"{model}-tokens.npy"), np.concatenate(token_ids))
+            documents[model] = names
+            sources[model] = model_sources
+
+        # The index is written last, so a store without index.json is incomplete
+        with open(os.path.join(path, "index.json.tmp"), "w") as f:
+            json.dump({"vocab": vocab, "documents": documents, "sources": sources}, f)
+        os.replace(
+            os.path.join(path, "index.json.tmp"), os.path.join(path, "index.json")
+        )
+
+        open_store.cache_clear()
+        return LogprobStore(path)
+
+
+@lru_cache(maxsize=None)
+def open_store(logprob_dir):
+    """
+    Returns the packed store for a logprobs folder, or None if it was never converted
+    """
+    path = os.path.join(logprob_dir, STORE_DIR)
+    if not os.path.exists(os.path.join(path, "index.json")):
+        return None
+    return LogprobStore(path)
+
+
+def find_logprob_dirs(paths):
+    """
+    Returns every folder named logprobs under the given paths
+    """
+    found = []
+    for path in paths:
+        if os.path.basename(os.path.normpath(path)) == "logprobs":
+            found.append(path)
+            continue
+        for root, dirs, _ in os.walk(path):
+            if "logprobs" in dirs:
+                found.append(os.path.join(root, "logprobs"))
+            dirs[:] = [d for d in dirs if d != "logprobs"]
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert logprobs/*.txt folders into packed memory-mapped stores"
+    )
+    parser.add_argument("paths", nargs="+", help="Dataset or logprobs folders")
+    parser.add_argument("--models", nargs="+", default=list(DEFAULT_MODELS))
+    args = parser.parse_args()
+
+    for logprob_dir in find_logprob_dirs(args.paths):
+        print(f"Packing {logprob_dir}...")
+        LogprobStore.build(logprob_dir, models=args.models)
@@ -1,34 +1,151 @@
+import argparse
+import json
+import os
+
+import numpy as np
 import tqdm
-from collections import defaultdict, Counter
+
+# Bump when the arrays or attributes of the n-gram models change
+TRIGRAM_ARTIFACT_VERSION = 1
+TRIGRAM_LEVELS = ("base", "bigram", "trigram")
+
+
+def pack_ngrams(columns, base):
+    """
+    Packs equal-length columns of token ids into int64 keys, first token most
+    significant. Rows with a token outside [0, base) get the key -1, which never
+    matches a stored key.
+    """
+    columns = [np.asarray(column, dtype=np.int64) for column in columns]
+    if not columns:
+        return np.zeros(1, dtype=np.int64)
+
+    keys = np.zeros(len(columns[0]), dtype=np.int64)
+    valid = np.ones(len(columns[0]), dtype=bool)
+    for column in columns:
+        keys = keys * base + column
+        valid &= (column >= 0) & (column < base)
+    keys[~valid] = -1
+    return keys
+
+
+def pack_ngram(n_gram, base):
+    """
+    Packs a single n-gram into an int64 key, see pack_ngrams
+    """
+    key = 0
+    for token in n_gram:
+        if not 0 <= token < base:
+            return -1
+        key = key * base + int(token)
+    return key
+
+
+def sorted_lookup(sorted_keys, key, values):
+    """
+    Returns values[i] where sorted_keys[i] == key, or 0 if key is not present
+    """
+    i = sorted_keys.searchsorted(key)
+    if i < len(sorted_keys) and sorted_keys[i] == key:
+        return values[i].item()
+    return 0
+
+
+def sorted_lookups(sorted_keys, keys, values):
+    """
+    Vectorized sorted_lookup over an array of keys
+    """
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=values.dtype)
+    i = np.minimum(sorted_keys.searchsorted(keys), len(sorted_keys) - 1)
+    return np.where(sorted_keys[i] == keys, values[i], 0)
 
 
 class NGramModel:
     """
     An n-gram model, where alpha is the laplace smoothing parameter.
+
+    Counts are stored as sorted int64 arrays of packed n-grams (keys, counts) and
+    packed contexts (context_keys, context_totals, context_types), where
+    context_types is the number of distinct tokens seen after each context.
     """
 
     def __init__(self, train_text, n=2, alpha=3e-3, vocab_size=None):
         self.n = n
         if vocab_size is None:
             # Assume GPT tokenizer
-            self.vocab_size = 50257
+            vocab_size = 50257
+        self.vocab_size = vocab_size
 
         self.smoothing = alpha
         self.smoothing_f = alpha * self.vocab_size
 
-        self.c = defaultdict(lambda: [0, Counter()])
-        for i in tqdm.tqdm(range(len(train_text)-n)):
-            n_gram = tuple(train_text[i:i+n])
-            self.c[n_gram[:-1]][1][n_gram[-1]] += 1
-            self.c[n_gram[:-1]][0] += 1
-        self.n_size = len(self.c)
+        tokens = np.asarray(train_text, dtype=np.int64)
+        self.base = int(max(self.vocab_size, tokens.max(initial=-1) + 1))
+
+        # The last n-gram of train_text is not counted
+        size = max(len(tokens) - n, 0)
+        keys = pack_ngrams([tokens[i : i + size] for i in range(n)], self.base)
+        self.keys, self.counts = np.unique(keys[:size], return_counts=True)
+
+        # Keys are sorted, so n-grams sharing a context are contiguous
+        self.context_keys, starts = np.unique(
+            self.keys // self.base, return_index=True
+        )
+        self.context_totals = np.add.reduceat(self.counts, starts) if size else starts
+        self.context_types = np.diff(np.append(starts, len(self.keys)))
+        self.n_size = len(self.context_keys)
+
+    def context_stats(self, context):
+        """
+        Returns (total count, number of distinct next tokens) of a context
+        """
+        key = pack_ngram(context, self.base)
+        i = self.context_keys.searchsorted(key)
+        if i < len(self.context_keys) and self.context_keys[i] == key:
+            return self.context_totals[i].item(), self.context_types[i].item()
+        return 0, 0
+
+    def count(self, n_gram):
+        return sorted_lookup(self.keys, pack_ngram(n_gram, self.base), self.counts)
 
     def n_gram_probability(self, n_gram):
         assert len(n_gram) == self.n
-        it = self.c[tuple(n_gram[:-1])]
-        prob = (it[1][n_gram[-1]] + self.smoothing)/(it[0] + self.smoothing_f)
+        total, _ = self.context_stats(n_gram[:-1])
+        prob = (self.count(n_gram) + self.smoothing)/(total + self.smoothing_f)
         return prob
 
+    def n_gram_probabilities(self, tokens):
+        """
+        Returns the probability of every n-gram of a token sequence, the same as
+        [n_gram_probability(g) for g in ngrams(tokens, n)]
+        """
+        tokens = np.asarray(tokens, dtype=np.int64)
+        size = max(len(tokens) - self.n + 1, 0)
+        return self.column_probabilities([tokens[i : i + size] for i in range(self.n)])
+
+    def column_stats(self, columns):
+        """
+        Returns (totals, distinct next token counts) of the contexts formed by
+        the token columns, and the counts of the n-grams formed by columns + next
+        """
+        # An empty context (n=1) packs to a single key shared by every n-gram
+        contexts = np.broadcast_to(
+            pack_ngrams(columns[:-1], self.base), len(columns[-1])
+        )
+        totals = sorted_lookups(self.context_keys, contexts, self.context_totals)
+        types = sorted_lookups(self.context_keys, contexts, self.context_types)
+        counts = sorted_lookups(self.keys, pack_ngrams(columns, self.base), self.counts)
+        return totals, types, counts
+
+    def column_probabilities(self, columns):
+        """
+        Vectorized n_gram_probability, where columns[i] holds the i-th token of
+        every n-gram
+        """
+        totals, _, counts = self.column_stats(columns)
+        return (counts + self.smoothing)/(totals + self.smoothing_f)
+
 
 class DiscountBackoffModel(NGramModel):
     """
@@ -42,19 +159,34 @@ class DiscountBackoffModel(NGramModel):
 
     def n_gram_probability(self, n_gram):
         assert len(n_gram) == self.n
-        it = self.c[tuple(n_gram[:-1])]
+        total, types = self.context_stats(n_gram[:-1])
 
-        if it[0] == 0:
+        if total == 0:
             return self.lower_order_model.n_gram_probability(n_gram[1:])
 
         prob = self.discount * \
-            (len(it[1])/it[0]) * \
+            (types/total) * \
             self.lower_order_model.n_gram_probability(n_gram[1:])
-        if it[1][n_gram[-1]] != 0:
-            prob += max(it[1][n_gram[-1]] - self.discount, 0) / it[0]
+        count = self.count(n_gram)
+        if count != 0:
+            prob += max(count - self.discount, 0) / total
 
         return prob
 
+    def column_probabilities(self, columns):
+        totals, types, counts = self.column_stats(columns)
+        lower = self.lower_order_model.column_probabilities(columns[1:])
+
+        seen = totals != 0
+        totals = np.where(seen, totals, 1)
+        prob = self.discount * \
+            (types/totals) * \
+            lower
+        discounted = np.maximum(counts - self.discount, 0) / totals
+        prob = np.where(counts != 0, prob + discounted, prob)
+
+        return np.where(seen, prob, lower)
+
 
 class KneserNeyBaseModel(NGramModel):
     """
@@ -64,27 +196,30 @@ class KneserNeyBaseModel(NGramModel):
     def __init__(self, train_text, vocab_size=None):
         super().__init__(train_text, n=1, vocab_size=vocab_size)
 
-        base_cnt = defaultdict(set)
-        for i in range(1, len(train_text)):
-            base_cnt[train_text[i]].add(train_text[i-1])
+        # Distinct (previous token, token) pairs, then the number of distinct
+        # predecessors of every token
+        tokens = np.asarray(train_text, dtype=np.int64)
+        pairs = np.unique(pack_ngrams([tokens[:-1], tokens[1:]], self.base))
+        words, predecessors = np.unique(pairs % self.base, return_counts=True)
 
-        cnt = 0
-        for word in base_cnt:
-            cnt += len(base_cnt[word])
-
-        self.prob = defaultdict(float)
-        for word in base_cnt:
-            self.prob[word] = len(base_cnt[word]) / cnt
+        self.prob = np.zeros(self.base)
+        self.prob[words] = predecessors / len(pairs)
 
     def n_gram_probability(self, n_gram):
         assert len(n_gram) == 1
-        ret_prob = self.prob[n_gram[0]]
+        ret_prob = self.prob[n_gram[0]].item() if 0 <= n_gram[0] < self.base else 0
 
         if ret_prob == 0:
             return 1 / self.vocab_size
         else:
             return ret_prob
 
+    def column_probabilities(self, columns):
+        words = columns[0]
+        valid = (words >= 0) & (words < self.base)
+        prob = np.where(valid, self.prob[np.where(valid, words, 0)], 0)
+        return np.where(prob == 0, 1 / self.vocab_size, prob)
+
 
 class TrigramBackoff:
     """
@@ -101,3 +236,124 @@ class TrigramBackoff:
     def n_gram_probability(self, n_gram):
         assert len(n_gram) == 3
         return self.trigram.n_gram_probability(n_gram)
+
+    def n_gram_probabilities(self, tokens):
+        return self.trigram.n_gram_probabilities(tokens)
+
+
+def get_tokenizer(name):
+    """
+    Returns the encode function (text -> token ids) of a supported tokenizer
+    """
+    if name == "davinci":
+        import tiktoken
+
+        return tiktoken.encoding_for_model("davinci").encode
+    if name == "llama-2-7b":
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained("meta-llama/Llama-2-7b-hf")
+        return lambda text: tokenizer(text)["input_ids"]
+    raise ValueError(f"Unknown tokenizer: {name}")
+
+
+def default_trigram_path(tokenizer):
+    return os.path.join("model", f"trigram-{tokenizer}.npz")
+
+
+def save_trigram(model, path, tokenizer):
+    """
+    Saves a TrigramBackoff as an uncompressed .npz: the arrays of every level plus
+    a JSON header with the artifact version, the tokenizer name and the scalar
+    parameters (n, smoothing, vocab size, discount) of every level
+    """
+    arrays, levels = {}, {}
+    for level in TRIGRAM_LEVELS:
+        levels[level] = {}
+        for name, value in vars(getattr(model, level)).items():
+            if isinstance(value, np.ndarray):
+                arrays[f"{level}-{name}"] = value
+            elif isinstance(value, (int, float)):
+                levels[level][name] = value
+
+    header = {
+        "version": TRIGRAM_ARTIFACT_VERSION,
+        "tokenizer": tokenizer,
+        "levels": levels,
+    }
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "wb") as f:
+        np.savez(f, header=np.array(json.dumps(header)), **arrays)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_trigram(path, tokenizer=None):
+    """
+    Loads a TrigramBackoff saved with save_trigram. If tokenizer is given, the
+    artifact must have been built with it.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"{path} not found, build it with: python -m utils.n_gram "
+            f"--tokenizer {tokenizer or 'davinci'} --output {path}"
+        )
+
+    with np.load(path) as data:
+        header = json.loads(data["header"].item())
+        if header["version"] != TRIGRAM_ARTIFACT_VERSION:
+            raise ValueError(
+                f"{path} has artifact version {header['version']}, expected "
+                f"{TRIGRAM_ARTIFACT_VERSION}; rebuild it with python -m utils.n_gram"
+            )
+        if tokenizer is not None and header["tokenizer"] != tokenizer:
+            raise ValueError(
+                f"{path} was built with the {header['tokenizer']} tokenizer, "
+                f"not {tokenizer}"
+            )
+
+        # Rebuild the models without training, lower orders first
+        models = {}
+        classes = (KneserNeyBaseModel, DiscountBackoffModel, DiscountBackoffModel)
+        lower_order_model = None
+        for level, cls in zip(TRIGRAM_LEVELS, classes):
+            m = cls.__new__(cls)
+            vars(m).update(header["levels"][level])
+            for name in data.files:
+                if name.startswith(f"{level}-"):
+                    setattr(m, name[len(level) + 1 :], data[name])
+            if lower_order_model is not None:
+                m.lower_order_model = lower_order_model
+            models[level] = lower_order_model = m
+
+    model = TrigramBackoff.__new__(TrigramBackoff)
+    vars(model).update(models)
+    model.tokenizer = header["tokenizer"]
+    return model
+
+
+if __name__ == "__main__":
+    from nltk.corpus import brown
+
+    parser = argparse.ArgumentParser(
+        description="Train the trigram model on the brown corpus and save it as .npz"
+    )
+    parser.add_argument(
+        "--tokenizer", default="davinci", choices=["davinci", "llama-2-7b"]
+    )
+    parser.add_argument(
+        "--output", default=None, help="Defaults to model/trigram-{tokenizer}.npz"
+    )
+    args = parser.parse_args()
+
+    tokenizer = get_tokenizer(args.tokenizer)
+    output = args.output or default_trigram_path(args.tokenizer)
+
+    print("Tokenizing corpus...")
+    tokenized_corpus = []
+    for sentence in tqdm.tqdm(brown.sents()):
+        tokenized_corpus += tokenizer(" ".join(sentence))
+
+    print("Training n-gram model...")
+    save_trigram(TrigramBackoff(tokenized_corpus), output, args.tokenizer)
+    print(f"Saved {output}")
@@ -1,10 +1,8 @@
 from nltk.util import ngrams
-from nltk.corpus import brown
 from nltk.tokenize import word_tokenize
 
 import tqdm
 import numpy as np
-import tiktoken
 import dill as pickle
 
 from utils.featurize import *
@@ -93,32 +91,101 @@ def backtrack_functions(
     return ret
 
 
-def train_trigram(verbose=True, return_tokenizer=False):
+def parse_exp(exp):
     """
-    Trains and returns a trigram model on the brown corpus
+    Splits an expression into its base vector, a list of (vec_function, vector)
+    steps and the final scalar function
     """
+    words = get_words(exp)
+    return words[0], list(zip(words[1:-1:2], words[2:-1:2])), words[-1]
 
-    enc = tiktoken.encoding_for_model("davinci")
-    tokenizer = enc.encode
-    vocab_size = enc.n_vocab
 
-    # We use the brown corpus to train the n-gram model
-    sentences = brown.sents()
+def build_exp_tree(exps):
+    """
+    Merges expressions into a prefix tree. Every node stands for the vector
+    obtained from a base vector and a sequence of steps, and lists the scalar
+    functions applied to it, so expressions sharing a prefix share its nodes.
+    """
+    roots = {}
+    for exp in exps:
+        base, steps, scalar = parse_exp(exp)
+        node = roots.setdefault(base, {"children": {}, "scalars": []})
+        for step in steps:
+            node = node["children"].setdefault(step, {"children": {}, "scalars": []})
+        node["scalars"].append((scalar, exp))
+    return roots
 
-    if verbose:
-        print("Tokenizing corpus...")
-    tokenized_corpus = []
-    for sentence in tqdm.tqdm(sentences):
-        tokens = tokenizer(" ".join(sentence))
-        tokenized_corpus += tokens
 
-    if verbose:
-        print("\nTraining n-gram model...")
+def eval_exp_tree(roots, vector_map, file, reductions=scalar_functions):
+    """
+    Evaluates every expression of a prefix tree on a file, computing each
+    intermediate vector once. Returns a dict of expression -> value.
+    """
+    values = {}
+
+    def visit(node, curr):
+        for scalar, exp in node["scalars"]:
+            values[exp] = reductions[scalar](curr)
+        for (func, vec), child in node["children"].items():
+            visit(child, vec_functions[func](curr, vector_map[vec](file)))
+
+    for base, node in roots.items():
+        visit(node, vector_map[base](file))
+    return values
+
+
+def get_masked_scalar_functions(mask):
+    """
+    Versions of scalar_functions for padded (docs x tokens) matrices, reducing the
+    entries where mask is True along the token axis to one value per document
+    """
+    lengths = mask.sum(axis=1)
+
+    def masked_sum(x):
+        return np.where(mask, x, 0).sum(axis=1, dtype=np.float64)
+
+    def masked_var(x):
+        mean = masked_sum(x) / lengths
+        return masked_sum(np.square(x - mean[:, None])) / lengths
 
-    if return_tokenizer:
-        return TrigramBackoff(tokenized_corpus), tokenizer
-    else:
-        return TrigramBackoff(tokenized_corpus)
+    return {
+        "s-max": lambda x: np.where(mask, x, -np.inf).max(axis=1),
+        "s-min": lambda x: np.where(mask, x, np.inf).min(axis=1),
+        "s-avg": lambda x: masked_sum(x) / lengths,
+        "s-avg-top-25": lambda x: top_k_sums(x, lengths)[0] / np.minimum(lengths, 25),
+        "s-len": lambda x: lengths.astype(np.float64),
+        "s-var": masked_var,
+        "s-l2": lambda x: np.sqrt(masked_sum(np.square(x, dtype=np.float64))),
+    }
+
+
+def eval_exps_batch(exps, vector_map, files, dtype=np.float32):
+    """
+    Evaluates expressions on all files at once. Every base vector is stacked into
+    a zero-padded (docs x max_tokens) matrix, each vec_function runs once over the
+    whole matrix and scalar functions become masked reductions along the token
+    axis. Returns a dict of expression -> vector of values, one per file.
+    """
+    matrices, lengths = {}, None
+    for name in vector_map:
+        matrices[name], name_lengths = pad_vectors(
+            [vector_map[name](file) for file in files], dtype=dtype
+        )
+        if lengths is not None and not np.array_equal(lengths, name_lengths):
+            raise ValueError(f"{name} vectors differ in length from the others")
+        lengths = name_lengths
+
+    mask = np.arange(matrices[name].shape[1]) < lengths[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return eval_exp_tree(
+            build_exp_tree(exps),
+            {
+                name: lambda _, matrix=matrix: matrix
+                for name, matrix in matrices.items()
+            },
+            None,
+            reductions=get_masked_scalar_functions(mask),
+        )
 
 
 def get_all_logprobs(
@@ -130,7 +197,10 @@ def get_all_logprobs(
     num_tokens=2047,
 ):
     if trigram is None:
-        trigram, tokenizer = train_trigram(verbose=verbose, return_tokenizer=True)
+        trigram = load_trigram(default_trigram_path("davinci"), tokenizer="davinci")
+    if tokenizer is None:
+        # Only load_trigram records the tokenizer; models built in memory are davinci
+        tokenizer = get_tokenizer(getattr(trigram, "tokenizer", "davinci"))
 
     davinci_logprobs, ada_logprobs = {}, {}
     trigram_logprobs, unigram_logprobs = {}, {}
@@ -168,9 +238,14 @@ def generate_symbolic_data(
     output_file="symbolic_data",
     verbose=True,
     vector_map=None,
+    batch=False,
+    trigram=None,
+    tokenizer=None,
 ):
     """
-    Brute forces and generates symbolic data from a dataset of text files.
+    Brute forces and generates symbolic data from a dataset of text files. With
+    batch=True, features are computed over all documents at once in float32 with
+    eval_exps_batch.
     """
     if vector_map is None:
         (
@@ -178,7 +253,13 @@ def generate_symbolic_data(
             ada_logprobs,
             trigram_logprobs,
             unigram_logprobs,
-        ) = get_all_logprobs(generate_dataset, preprocess=preprocess, verbose=verbose)
+        ) = get_all_logprobs(
+            generate_dataset,
+            preprocess=preprocess,
+            verbose=verbose,
+            trigram=trigram,
+            tokenizer=tokenizer,
+        )
 
         vector_map = {
             "davinci-logprobs": lambda file: davinci_logprobs[file],
@@ -187,7 +268,7 @@ def generate_symbolic_data(
             "unigram-logprobs": lambda file: unigram_logprobs[file],
         }
 
-        all_funcs = backtrack_functions(max_depth=max_depth)
+    all_funcs = backtrack_functions(max_depth=max_depth)
 
     if verbose:
         print(f"\nTotal # of Features: {len(all_funcs)}.")
@@ -196,39 +277,47 @@ def generate_symbolic_data(
             print(all_funcs[np.random.randint(0, len(all_funcs))])
         print("\nGenerating datasets...")
 
-    def calc_features(file, exp):
-        exp_tokens = get_words(exp)
-        curr = vector_map[exp_tokens[0]](file)
-
-        for i in range(1, len(exp_tokens)):
-            if exp_tokens[i] in vec_functions:
-                next_vec = vector_map[exp_tokens[i + 1]](file)
-                curr = vec_functions[exp_tokens[i]](curr, next_vec)
-            elif exp_tokens[i] in scalar_functions:
-                return scalar_functions[exp_tokens[i]](curr)
+    if batch:
+        values = eval_exps_batch(
+            all_funcs, vector_map, generate_dataset(lambda file: file)
+        )
+        exp_to_data = {exp: values[exp].reshape(-1, 1) for exp in all_funcs}
+        pickle.dump(exp_to_data, open(output_file, "wb"))
+        return
+
+    # Walk the files once and evaluate all expressions per file on the shared tree
+    exp_tree = build_exp_tree(all_funcs)
+    features = {exp: [] for exp in all_funcs}
+    for file in tqdm.tqdm(generate_dataset(lambda file: file)):
+        for exp, value in eval_exp_tree(exp_tree, vector_map, file).items():
+            features[exp].append(value)
 
     exp_to_data = {}
-    for exp in tqdm.tqdm(all_funcs):
-        exp_to_data[exp] = generate_dataset(
-            lambda file: calc_features(file, exp)
-        ).reshape(-1, 1)
+    for exp in all_funcs:
+        exp_to_data[exp] = np.array(features[exp]).reshape(-1, 1)
 
     pickle.dump(exp_to_data, open(output_file, "wb"))
 
 
 def get_exp_featurize(best_features, vector_map):
-    def calc_features(file, exp):
-        exp_tokens = get_words(exp)
-        curr = vector_map[exp_tokens[0]](file)
-
-        for i in range(1, len(exp_tokens)):
-            if exp_tokens[i] in vec_functions:
-                next_vec = vector_map[exp_tokens[i + 1]](file)
-                curr = vec_functions[exp_tokens[i]](curr, next_vec)
-            elif exp_tokens[i] in scalar_functions:
-                return scalar_functions[exp_tokens[i]](curr)
+    exp_tree = build_exp_tree(best_features)
 
     def exp_featurize(file):
-        return np.array([calc_features(file, exp) for exp in best_features])
+        values = eval_exp_tree(exp_tree, vector_map, file)
+        return np.array([values[exp] for exp in best_features])
 
     return exp_featurize
+
+
+def get_exp_featurize_batch(best_features, vector_map, dtype=np.float32):
+    """
+    Batch version of get_exp_featurize: the returned function takes a list of
+    files and returns a (len(files) x len(best_features)) matrix computed with
+    eval_exps_batch
+    """
+
+    def exp_featurize_batch(files):
+        values = eval_exps_batch(best_features, vector_map, files, dtype=dtype)
+        return np.stack([values[exp] for exp in best_features], axis=1)
+
+    return exp_featurize_batch
@@ -4,25 +4,38 @@ import numpy as np
 import tiktoken
 import torch
 import torch.nn.functional as F
+from functools import lru_cache
 from transformers import AutoTokenizer
 
 
-tokenizer = tiktoken.encoding_for_model("davinci")
-
-llama_tokenizer = AutoTokenizer.from_pretrained("meta-llama/Llama-2-7b-hf")
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-vocab_map = {}
-vocab = llama_tokenizer.vocab
-for token in vocab:
-    idx = vocab[token]
-    vocab_map[idx] = token
+
+# The tokenizers are loaded on first use, so importing utils needs no download
+# (the llama tokenizer is gated on the Hugging Face hub)
+@lru_cache(maxsize=None)
+def get_davinci_tokenizer():
+    return tiktoken.encoding_for_model("davinci")
+
+
+@lru_cache(maxsize=None)
+def get_llama_tokenizer():
+    return AutoTokenizer.from_pretrained("meta-llama/Llama-2-7b-hf")
+
+
+@lru_cache(maxsize=None)
+def get_llama_vocab_map():
+    """
+    Returns a map from llama token ids to tokens
+    """
+    return {idx: token for token, idx in get_llama_tokenizer().vocab.items()}
 
 
 def write_logprobs(text, file, model):
     """
     Run text under model and write logprobs to file, separated by newline.
     """
+    tokenizer = get_davinci_tokenizer()
     tokens = tokenizer.encode(text)
     doc = tokenizer.decode(tokens[:2047])
 
@@ -52,6 +65,7 @@ def write_logprobs(text, file, model):
 
 
 def write_llama_logprobs(text, file, model):
+    llama_tokenizer, vocab_map = get_llama_tokenizer(), get_llama_vocab_map()
     with torch.no_grad():
         encodings = llama_tokenizer(text, return_tensors="pt").to(device)
         logits = F.softmax(model(encodings["input_ids"]).logits, dim=2)
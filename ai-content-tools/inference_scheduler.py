@@ -0,0 +1,188 @@
+"""
+Süreç içi dinamik mikro-batching zamanlayıcısı.
+
+Eşzamanlı isteklerden gelen öğeler (ör. cümleler) tek bir kuyrukta toplanır;
+bir arka plan thread'i max_batch_size öğeye ulaşana ya da ilk öğeden sonra
+max_wait_ms dolana kadar bekleyip hepsini tek bir score_fn çağrısıyla skorlar
+ve sonuçları ilgili çağıranlara dağıtır.
+"""
+import collections
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+
+class _Job:
+    """Bir submit() çağrısının öğeleri ve sonuçları"""
+    __slots__ = ('results', 'remaining', 'done', 'error', 'cancelled')
+
+    def __init__(self, size):
+        self.results = [None] * size
+        self.remaining = size
+        self.done = threading.Event()
+        self.error = None
+        # Çağıran beklemeyi bıraktıysa kuyrukta kalan öğeleri skorlanmaz
+        self.cancelled = False
+
+class InferenceScheduler:
+    # Batch boyutu histogramının üst sınırları
+    BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+    def __init__(self, score_fn, max_batch_size=32, max_wait_ms=10.0, name='inference-scheduler'):
+        """
+        score_fn: öğe listesi alıp aynı sırada sonuç listesi döndüren fonksiyon
+        """
+        self.score_fn = score_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._batches_total = 0
+        self._items_total = 0
+        self._cancelled_total = 0
+        self._max_batch_seen = 0
+        self._batch_histogram = collections.Counter()
+        self._recent_waits_ms = collections.deque(maxlen=2048)
+        self._recent_batch_ms = collections.deque(maxlen=2048)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def reset(self):
+        """
+        Fork sonrası çocuk süreçte çağrılır: ebeveynden kopyalanan kuyruk ve
+        kilit atılır, worker thread yeniden başlatılır.
+        """
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        return self.start()
+
+    def stop(self, timeout=None):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, items, timeout=None):
+        """
+        Öğeleri kuyruğa ekler ve skorlanana kadar bekler; sonuçları sırayla döndürür.
+        timeout dolarsa iş iptal edilir (henüz skorlanmamış öğeleri atlanır) ve
+        TimeoutError fırlatılır.
+        """
+        items = list(items)
+        if not items:
+            return []
+        if self._thread is None:
+            self.start()
+        job = _Job(len(items))
+        enqueued_at = time.monotonic()
+        for index, item in enumerate(items):
+            self._queue.put((job, index, item, enqueued_at))
+        if not job.done.wait(timeout):
+            job.cancelled = True
+            raise TimeoutError(f"{self.name}: results not ready within {timeout}s")
+        if job.error is not None:
+            raise job.error
+        return job.results
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            if first[0].cancelled:
+                self._skip_cancelled(1)
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                if entry[0].cancelled:
+                    self._skip_cancelled(1)
+                    continue
+                batch.append(entry)
+            self._process(batch)
+            if stopping:
+                return
+
+    def _skip_cancelled(self, count):
+        with self._lock:
+            self._cancelled_total += count
+
+    def _process(self, batch):
+        # Batch toplanırken zaman aşımına uğrayan işlerin öğeleri de atlanır
+        live = [entry for entry in batch if not entry[0].cancelled]
+        if len(live) < len(batch):
+            self._skip_cancelled(len(batch) - len(live))
+            batch = live
+            if not batch:
+                return
+        started = time.monotonic()
+        try:
+            outputs = self.score_fn([item for _, _, item, _ in batch])
+        except Exception as e:
+            logging.error(f"❌ {self.name} batch failed: {e}")
+            for job, _, _, _ in batch:
+                job.error = e
+                job.done.set()
+            return
+        finished = time.monotonic()
+
+        for (job, index, _, _), output in zip(batch, outputs):
+            job.results[index] = output
+            job.remaining -= 1
+            if job.remaining == 0 and job.error is None:
+                job.done.set()
+
+        with self._lock:
+            self._batches_total += 1
+            self._items_total += len(batch)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            bucket = next((b for b in self.BATCH_SIZE_BUCKETS if len(batch) <= b), float('inf'))
+            self._batch_histogram[bucket] += 1
+            self._recent_waits_ms.extend((started - enqueued_at) * 1000.0 for _, _, _, enqueued_at in batch)
+            self._recent_batch_ms.append((finished - started) * 1000.0)
+
+    def stats(self):
+        """Kuyruk derinliği, batch boyutu ve bekleme süresi istatistikleri"""
+        with self._lock:
+            waits = np.array(self._recent_waits_ms) if self._recent_waits_ms else None
+            batch_ms = np.array(self._recent_batch_ms) if self._recent_batch_ms else None
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': round(self.max_wait * 1000.0, 3),
+                'batches_total': self._batches_total,
+                'items_total': self._items_total,
+                'cancelled_items_total': self._cancelled_total,
+                'mean_batch_size': round(self._items_total / self._batches_total, 3) if self._batches_total else 0.0,
+                'max_batch_seen': self._max_batch_seen,
+                'batch_size_histogram': {
+                    ('+Inf' if b == float('inf') else f"le_{b}"): count
+                    for b, count in sorted(self._batch_histogram.items())
+                },
+                'queue_wait_ms': {
+                    'p50': round(float(np.percentile(waits, 50)), 3),
+                    'p99': round(float(np.percentile(waits, 99)), 3),
+                } if waits is not None else None,
+                'batch_latency_ms': {
+                    'p50': round(float(np.percentile(batch_ms, 50)), 3),
+                    'p99': round(float(np.percentile(batch_ms, 99)), 3),
+                } if batch_ms is not None else None,
+            }
@@ -0,0 +1,114 @@
+"""
+Bağımlılıksız, karakter n-gram tabanlı hızlı dil tanıma.
+
+Her dil için gömülü örnek metinden 1-3 karakterlik n-gram frekans profili
+çıkarılır; girdi, profiller altında (add-one düzeltmeli) naive Bayes log
+olabilirliği ile skorlanır. Uzun girdilerde yalnızca ilk max_chars karakter
+kullanılır, böylece maliyet metin uzunluğundan bağımsızdır (~1ms).
+"""
+import math
+import re
+from collections import Counter
+
+LANGUAGE_SAMPLES = {
+    'tr': (
+        "Bu ürünü geçen hafta aldım ve şimdiye kadar çok memnun kaldım. Kargo hızlı geldi, "
+        "paketleme de özenliydi. Türkiye'nin farklı şehirlerinde yaşayan insanlar her gün "
+        "işe gitmek için toplu taşımayı kullanıyor. Çocuklar okuldan döndükten sonra parkta "
+        "oynamayı çok seviyor. Öğretmenimiz bize bu konunun sınavda çıkacağını söyledi. "
+        "Akşam yemeğinde annemin yaptığı mercimek çorbasını içtik, ardından çay demledik. "
+        "Şirketin yeni yönetim kurulu gelecek yıl için büyüme hedeflerini açıkladı. "
+        "Bilim insanları iklim değişikliğinin etkilerini azaltmak için çalışmalarını sürdürüyor. "
+        "Kitabı bir oturuşta bitirdim, sonu gerçekten beklenmedikti ve çok etkileyiciydi. "
+        "Hava güzel olduğu için sahilde uzun bir yürüyüş yaptık ve denizi izledik. "
+        "Bu çalışmada önerilen yöntemin doğruluğu kapsamlı deneylerle doğrulanmıştır. "
+        "Müşteri hizmetleri sorunumu hemen çözdü, ilgilendikleri için teşekkür ederim. "
+        "Yarın sabah erkenden yola çıkacağız, o yüzden bu gece eşyalarımızı hazırlamalıyız. "
+        "Üniversitede okuduğum yıllarda pek çok arkadaş edindim ve hâlâ görüşüyoruz. "
+        "Ülkemizin tarihi ve kültürel mirası, dünyanın dört bir yanından ziyaretçi çekiyor."
+    ),
+    'en': (
+        "I bought this product last week and so far I am very happy with it. Shipping was fast "
+        "and the packaging was careful. People living in different cities use public transport "
+        "every day to get to work. The children love to play in the park after they come home "
+        "from school. Our teacher told us that this topic would be on the exam. For dinner we "
+        "had the soup my mother made, and then we brewed some tea. The company's new board "
+        "announced its growth targets for next year. Scientists are continuing their work to "
+        "reduce the effects of climate change. I finished the book in one sitting; the ending "
+        "was truly unexpected and very moving. Because the weather was nice, we took a long "
+        "walk on the beach and watched the sea. The accuracy of the proposed method has been "
+        "verified through extensive experiments. Customer service solved my problem right away, "
+        "thank you for taking care of it. We will leave early tomorrow morning, so we should pack "
+        "our things tonight. I made many friends during my years at university and we still keep "
+        "in touch. The history and cultural heritage of the country attract visitors from all "
+        "over the world. What do you think about the weather these days? It should be warmer."
+    ),
+}
+
+_NON_LETTERS = re.compile(r"[^\w]+|[\d_]+")
+
+def normalize(text):
+    """Türkçe'ye duyarlı küçük harf + harf dışı karakterleri tek boşluğa indirger"""
+    text = text.replace('I', 'ı').replace('İ', 'i').lower()
+    return ' ' + ' '.join(_NON_LETTERS.sub(' ', text).split()) + ' '
+
+def char_ngrams(text, orders=(1, 2, 3)):
+    for n in orders:
+        for i in range(len(text) - n + 1):
+            gram = text[i:i + n]
+            if gram != ' ' * n:
+                yield gram
+
+class LanguageIdentifier:
+    def __init__(self, samples=None, orders=(1, 2, 3), max_chars=1000, min_ngrams=12):
+        """
+        samples: {dil_kodu: örnek metin}; min_ngrams: bundan az n-gram içeren
+        girdilerde karar verilmez (identify None döner)
+        """
+        self.orders = orders
+        self.max_chars = max_chars
+        self.min_ngrams = min_ngrams
+        self.languages = tuple(sorted((samples or LANGUAGE_SAMPLES)))
+        self._log_probs = {}
+        self._unseen = {}
+        for language, sample in (samples or LANGUAGE_SAMPLES).items():
+            counts = Counter(char_ngrams(normalize(sample), orders))
+            total = sum(counts.values())
+            denominator = total + len(counts) + 1
+            self._log_probs[language] = {gram: math.log((c + 1) / denominator) for gram, c in counts.items()}
+            self._unseen[language] = math.log(1 / denominator)
+
+    def scores(self, text):
+        """Dil başına toplam log olabilirlik ve kullanılan n-gram sayısı"""
+        grams = Counter(char_ngrams(normalize(text[:self.max_chars]), self.orders))
+        n_grams = sum(grams.values())
+        scores = {}
+        for language in self.languages:
+            log_probs, unseen = self._log_probs[language], self._unseen[language]
+            scores[language] = sum(count * log_probs.get(gram, unseen) for gram, count in grams.items())
+        return scores, n_grams
+
+    def identify(self, text):
+        """
+        (dil_kodu, güven) döndürür; metin karar vermek için çok kısaysa (None, 0.0).
+        Güven, n-gram başına ortalama log olabilirlikler üzerinden softmax'tır.
+        """
+        scores, n_grams = self.scores(text)
+        if n_grams < self.min_ngrams:
+            return None, 0.0
+        best = max(scores, key=scores.get)
+        top = scores[best] / n_grams
+        normalizer = sum(math.exp(score / n_grams - top) for score in scores.values())
+        return best, 1.0 / normalizer
+
+    def route(self, text, languages, default, min_confidence=0.0):
+        """
+        Metni languages içindeki bir dile yönlendirir. Tanınamayan, modeli olmayan
+        ya da güveni min_confidence altında kalan metinler default'a düşer (kısa
+        marka/ürün adı + Türkçe karışımlarında karar zayıftır).
+        (dil, tespit_edilen_dil, güven) döndürür.
+        """
+        detected, confidence = self.identify(text)
+        if detected in languages and confidence >= min_confidence:
+            return detected, detected, confidence
+        return default, detected, confidence
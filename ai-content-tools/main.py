@@ -1,12 +1,25 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, make_response, stream_with_context
 from flask_cors import CORS
 import torch
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
+from transformers import GPT2TokenizerFast
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import re
+import os
+import json
 import numpy as np
 import logging
+import threading
+import time
+import functools
+import itertools
+from inference_scheduler import InferenceScheduler
+from result_cache import ResultCache
+from admission import AdmissionController, AdmissionRejected, RequestBudget
+from language_id import LanguageIdentifier
+from reference_index import LABELS, ReferenceIndex, corpus_digest, normalize_rows, read_corpus
+from model_backends import BACKENDS, load_causal_lm
+import detector_metrics
+from detector_metrics import BATCH_SIZE, REQUESTS, TOKENS_PROCESSED, instrument, stage
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -18,6 +31,88 @@ device = None
 hf_tokenizer_tr = None
 hf_model_tr = None
 embedding_model = None
+reference_index = None
+perplexity_scheduler = None
+
+# Eşzamanlı isteklerin cümlelerini tek forward pass'te birleştiren zamanlayıcı
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '1') == '1'
+SCHEDULER_MAX_BATCH_SIZE = int(os.environ.get('SCHEDULER_MAX_BATCH_SIZE', '32'))
+SCHEDULER_MAX_WAIT_MS = float(os.environ.get('SCHEDULER_MAX_WAIT_MS', '10'))
+# Scheduler sonucunu beklemenin üst sınırı (saniye); isteğin deadline'ı daha
+# yakınsa o kullanılır. Takılan bir batch istek thread'ini sonsuza dek tutmasın
+SCHEDULER_SUBMIT_TIMEOUT = float(os.environ.get('SCHEDULER_SUBMIT_TIMEOUT', '120'))
+
+# Cümle perplexity'leri ve paragraf embedding skorları için sonuç cache'i
+# (RESULT_CACHE_DB verilirse SQLite disk katmanı da açılır)
+RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', '1') == '1'
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('RESULT_CACHE_SIZE', '10000')),
+    ttl_seconds=float(os.environ.get('RESULT_CACHE_TTL', '86400')),
+    db_path=os.environ.get('RESULT_CACHE_DB') or None,
+    max_disk_entries=int(os.environ.get('RESULT_CACHE_DISK_MAX', '1000000'))
+) if RESULT_CACHE_ENABLED else None
+
+# Endpoint başına kabul sınırları: max_tokens (istek başına token bütçesi),
+# deadline (saniye), concurrent (eşzamanlı istek) ve queue (bekleme kuyruğu).
+# ENDPOINT_LIMITS env değişkeni JSON ile alan bazında ezer, ör.
+# {"detect": {"max_tokens": 4096, "deadline": 10}}; 0/null sınırı kapatır.
+ENDPOINT_LIMITS = {
+    'detect': {'max_tokens': 8192, 'deadline': 30, 'concurrent': 4, 'queue': 32},
+    'detect_stream': {'max_tokens': 8192, 'deadline': 120, 'concurrent': 4, 'queue': 32},
+    'detect_batch': {'max_tokens': 500000, 'deadline': None, 'concurrent': 1, 'queue': 4},
+    'embedding_detect': {'max_tokens': 16384, 'deadline': 10, 'concurrent': 8, 'queue': 64},
+    'embedding_detect_stream': {'max_tokens': 16384, 'deadline': 60, 'concurrent': 8, 'queue': 64},
+}
+for endpoint, overrides in json.loads(os.environ.get('ENDPOINT_LIMITS') or '{}').items():
+    ENDPOINT_LIMITS.setdefault(endpoint, {}).update(overrides)
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '30'))
+admission_controllers = {
+    endpoint: AdmissionController(limits.get('concurrent') or 1, limits.get('queue') or 0, ADMISSION_QUEUE_TIMEOUT)
+    for endpoint, limits in ENDPOINT_LIMITS.items()
+}
+
+MODEL_NAME_TR = "ytu-ce-cosmos/turkish-gpt2-large"
+# Türkçe GPT-2 için inference backend'i: fp32 | int8 | onnx
+DETECTOR_BACKEND = os.environ.get('DETECTOR_BACKEND', 'fp32')
+if DETECTOR_BACKEND not in BACKENDS:
+    logging.error(f"❌ Unknown DETECTOR_BACKEND '{DETECTOR_BACKEND}', falling back to fp32.")
+    DETECTOR_BACKEND = 'fp32'
+# Dil bazında perplexity modelleri: istek, 'language' alanına ya da dil tanıma
+# sonucuna göre yönlenir. DETECTOR_LANGUAGE_MODELS JSON ile ezilebilir/genişletilir.
+LANGUAGE_MODELS = {'tr': MODEL_NAME_TR, 'en': 'gpt2'}
+LANGUAGE_MODELS.update(json.loads(os.environ.get('DETECTOR_LANGUAGE_MODELS') or '{}'))
+# Tanınamayan ya da modeli olmayan diller bu dile düşer
+DEFAULT_LANGUAGE = os.environ.get('DEFAULT_LANGUAGE', 'tr')
+if DEFAULT_LANGUAGE not in LANGUAGE_MODELS:
+    logging.error(f"❌ DEFAULT_LANGUAGE '{DEFAULT_LANGUAGE}' has no model, falling back to tr.")
+    DEFAULT_LANGUAGE = 'tr'
+# Dil tanıma güveni bunun altındaysa istek DEFAULT_LANGUAGE'a yönlenir; kısa
+# "Samsung Galaxy S23 Ultra 256GB Siyah" gibi başlıklar ~0.55 ile 'en' çıkar
+LANGUAGE_MIN_CONFIDENCE = float(os.environ.get('LANGUAGE_MIN_CONFIDENCE', '0.62'))
+# Başlangıçta yüklenen diller (pre-fork'ta worker'larla paylaşılır); diğerleri ilk kullanımda
+PRELOAD_LANGUAGES = [lang for lang in os.environ.get('PRELOAD_LANGUAGES', 'tr').split(',') if lang in LANGUAGE_MODELS]
+language_identifier = LanguageIdentifier()
+# dil -> {'tokenizer', 'model', 'device', 'scheduler'}
+language_detectors = {}
+language_load_locks = {lang: threading.Lock() for lang in LANGUAGE_MODELS}
+EMBEDDING_MODEL_NAME = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+# Referans kNN indekslerinin diskte tutulduğu dizin (.npy, mmap ile açılır)
+REFERENCE_EMBEDDING_DIR = os.environ.get(
+    'REFERENCE_EMBEDDING_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'embedding_cache')
+)
+# Etiketli referans korpusu (JSONL: {"text": ..., "label": "ai" | "human"});
+# verilmezse aşağıdaki gömülü referans cümleleri kullanılır
+REFERENCE_CORPUS_PATH = os.environ.get('REFERENCE_CORPUS_PATH')
+# kNN skorlaması: komşu sayısı ve arama modu (exact | ivf)
+REFERENCE_KNN_K = int(os.environ.get('REFERENCE_KNN_K', '10'))
+REFERENCE_INDEX_MODE = os.environ.get('REFERENCE_INDEX_MODE', 'exact')
+if REFERENCE_INDEX_MODE not in ('exact', 'ivf'):
+    logging.error(f"❌ Unknown REFERENCE_INDEX_MODE '{REFERENCE_INDEX_MODE}', falling back to exact.")
+    REFERENCE_INDEX_MODE = 'exact'
+# IVF küme sayısı (0: 4·√n) ve sorgu başına taranan küme sayısı
+REFERENCE_IVF_LISTS = int(os.environ.get('REFERENCE_IVF_LISTS', '0'))
+REFERENCE_IVF_NPROBE = int(os.environ.get('REFERENCE_IVF_NPROBE', '8'))
 
 # AI-generated text patterns for Turkish (embedding references)
 AI_REFERENCE_TEXTS = [
@@ -47,8 +142,151 @@ HUMAN_REFERENCE_TEXTS = [
     "İkinci defa aynı üründen alıyorum. Çok memnunum."
 ]
 
-def load_models():
-    global device, hf_tokenizer_tr, hf_model_tr, embedding_model
+# Yerel model dizini: <MODEL_DIR>/<org>__<model> altında safetensors varsa
+# oradan (mmap ile, ağ erişimi olmadan) yüklenir
+MODEL_DIR = os.environ.get('MODEL_DIR')
+# Yükleme sonrası her modelden küçük bir batch geçirerek lazy init'i tetikle
+WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', '1') == '1'
+# serve.py master sürecinde True: fork'a dayanıksız backend'ler (onnx) master'da
+# çağrılmaz, warmup'ları worker'da reinit_after_fork içinde yapılır
+PREFORK_MASTER = False
+WARMUP_TEXTS = [
+    "Bu kısa cümle modeli ısındırmak için kullanılır.",
+    "Isınma geçişi, ilk gerçek isteğin gecikmesini azaltır."
+]
+
+def detector_state_name(language):
+    """Dil modelinin readiness anahtarı (Türkçe için geriye uyumlu 'gpt2_turkish')"""
+    return 'gpt2_turkish' if language == 'tr' else f'gpt2_{language}'
+
+# Servis hazırlık durumu: starting -> loading -> warming -> ready (ya da failed)
+readiness = {
+    'state': 'starting',
+    'models': {**{detector_state_name(lang): 'pending' for lang in PRELOAD_LANGUAGES}, 'embedding_model': 'pending'},
+    'started_at': time.time(),
+    'ready_at': None,
+    'errors': {}
+}
+readiness_lock = threading.Lock()
+
+def set_model_state(name, state, error=None):
+    with readiness_lock:
+        readiness['models'][name] = state
+        if error is not None:
+            readiness['errors'][name] = str(error)
+
+def local_model_source(model_name):
+    """
+    MODEL_DIR altında modelin yerel kopyası varsa (path, kwargs) döndürür,
+    yoksa Hub adı ile (model_name, {}).
+    """
+    if MODEL_DIR:
+        path = os.path.join(MODEL_DIR, model_name.replace('/', '__'))
+        if os.path.isdir(path):
+            return path, {'local_files_only': True}
+    return model_name, {}
+
+def load_language_detector(language):
+    """
+    Dilin causal LM'ini (+ tokenizer ve scheduler) yükler ve language_detectors'a ekler
+    """
+    global device
+    model_name = LANGUAGE_MODELS[language]
+    name = detector_state_name(language)
+    set_model_state(name, 'loading')
+    try:
+        source, kwargs = local_model_source(model_name)
+        logging.info(f"Loading {language} HuggingFace model: {model_name} from {source}...")
+        # Fast tokenizer: aynı token'lar, ayrıca offset mapping desteği (document modu)
+        tokenizer = GPT2TokenizerFast.from_pretrained(source, **kwargs)
+        model_device = device
+        if DETECTOR_BACKEND != 'fp32' and model_device.type != 'cpu':
+            # int8 ve onnx backend'leri CPU'da çalışır
+            model_device = torch.device("cpu")
+        # Yerel dizinde safetensors varsa ağırlıklar mmap ile okunur
+        use_safetensors = source != model_name and any(f.endswith('.safetensors') for f in os.listdir(source))
+        model = load_causal_lm(model_name, DETECTOR_BACKEND, model_device, source=source,
+                               use_safetensors=True if use_safetensors else None, **kwargs)
+        model.eval()
+        if language == 'tr':
+            device = model_device
+        logging.info(f"✅ {language} model {model_name} loaded successfully ({DETECTOR_BACKEND} backend).")
+        scheduler = None
+        if SCHEDULER_ENABLED:
+            scheduler = InferenceScheduler(
+                lambda sentences: batch_sentence_perplexities(
+                    sentences, model, tokenizer, model_device, batch_size=len(sentences)
+                ),
+                max_batch_size=SCHEDULER_MAX_BATCH_SIZE,
+                max_wait_ms=SCHEDULER_MAX_WAIT_MS,
+                name=f'perplexity-scheduler-{language}'
+            ).start()
+            logging.info(f"✅ Perplexity scheduler started for {language} (max batch {SCHEDULER_MAX_BATCH_SIZE}, max wait {SCHEDULER_MAX_WAIT_MS}ms).")
+        if WARMUP_ENABLED and not (PREFORK_MASTER and not getattr(model, 'fork_safe', True)):
+            set_model_state(name, 'warming')
+            batch_sentence_perplexities(WARMUP_TEXTS, model, tokenizer, model_device)
+        language_detectors[language] = {
+            'tokenizer': tokenizer, 'model': model, 'device': model_device, 'scheduler': scheduler
+        }
+        set_model_state(name, 'ready')
+        return language_detectors[language]
+    except Exception as e:
+        logging.error(f"❌ Critical error loading model '{model_name}'. Error: {e}")
+        set_model_state(name, 'failed', e)
+        return None
+
+def get_language_detector(language):
+    """
+    Dilin modelini döndürür; yüklü değilse ilk kullanımda (dil başına bir kez)
+    yükler. Yükleme başarısız olduysa None.
+    """
+    detector = language_detectors.get(language)
+    if detector is not None:
+        return detector
+    with language_load_locks[language]:
+        if language in language_detectors:
+            return language_detectors[language]
+        with readiness_lock:
+            failed = readiness['models'].get(detector_state_name(language)) == 'failed'
+        if failed:
+            return None
+        return load_language_detector(language)
+
+def load_detector_model():
+    """
+    PRELOAD_LANGUAGES modellerini yükler; Türkçe model eski global'lere de atanır
+    """
+    global hf_tokenizer_tr, hf_model_tr, perplexity_scheduler
+    for language in PRELOAD_LANGUAGES:
+        detector = get_language_detector(language)
+        if language == 'tr' and detector is not None:
+            hf_tokenizer_tr, hf_model_tr = detector['tokenizer'], detector['model']
+            perplexity_scheduler = detector['scheduler']
+
+def load_embedding_model():
+    global embedding_model
+    # Load Sentence Transformer for embeddings
+    set_model_state('embedding_model', 'loading')
+    try:
+        source, _ = local_model_source(EMBEDDING_MODEL_NAME)
+        logging.info(f"Loading SentenceTransformer model for embeddings from {source}...")
+        embedding_model = SentenceTransformer(source)
+        logging.info("✅ Embedding model loaded successfully.")
+        build_reference_index()
+        if WARMUP_ENABLED:
+            set_model_state('embedding_model', 'warming')
+            embedding_model.encode(WARMUP_TEXTS)
+        set_model_state('embedding_model', 'ready')
+    except Exception as e:
+        logging.error(f"❌ Error loading embedding model: {e}")
+        set_model_state('embedding_model', 'failed', e)
+
+def load_models(background=False):
+    """
+    Modelleri paralel thread'lerde yükler. background=True ise hemen döner;
+    durum /api/ready ile izlenir.
+    """
+    global device
     if torch.cuda.is_available():
         device = torch.device("cuda")
         logging.info(f"✅ CUDA (GPU) is available. Using device: {torch.cuda.get_device_name(0)}")
@@ -57,118 +295,428 @@ def load_models():
         logging.info("⚠️ CUDA (GPU) not found. Falling back to CPU.")
 
     logging.info("Loading models...")
-    
-    # Load Turkish GPT2 model (existing)
-    model_name_tr = "ytu-ce-cosmos/turkish-gpt2-large"
-    try:
-        logging.info(f"Loading Turkish HuggingFace model: {model_name_tr}...")
-        hf_tokenizer_tr = GPT2Tokenizer.from_pretrained(model_name_tr)
-        hf_model_tr = GPT2LMHeadModel.from_pretrained(model_name_tr).to(device)
-        hf_model_tr.eval()
-        logging.info(f"✅ Turkish GPT2 model loaded successfully.")
-    except OSError as e:
-        logging.error(f"❌ Critical error loading model '{model_name_tr}'. Error: {e}")
-        
-    # Load Sentence Transformer for embeddings
-    try:
-        logging.info("Loading SentenceTransformer model for embeddings...")
-        embedding_model = SentenceTransformer('sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
-        logging.info("✅ Embedding model loaded successfully.")
-    except Exception as e:
-        logging.error(f"❌ Error loading embedding model: {e}")
-        
-    logging.info(f"✅ All models loaded successfully on {device}.")
+    with readiness_lock:
+        readiness['state'] = 'loading'
+
+    def run():
+        loaders = [
+            threading.Thread(target=load_detector_model, name='load-detector-models'),
+            threading.Thread(target=load_embedding_model, name='load-embedding-model'),
+        ]
+        for loader in loaders:
+            loader.start()
+        for loader in loaders:
+            loader.join()
+        with readiness_lock:
+            failed = [name for name, state in readiness['models'].items() if state != 'ready']
+            readiness['state'] = 'failed' if failed else 'ready'
+            readiness['ready_at'] = time.time()
+            startup_seconds = readiness['ready_at'] - readiness['started_at']
+        if failed:
+            logging.error(f"❌ Models failed to load: {', '.join(failed)}")
+        else:
+            logging.info(f"✅ All models loaded successfully on {device} in {startup_seconds:.1f}s.")
+
+    if background:
+        threading.Thread(target=run, name='load-models', daemon=True).start()
+    else:
+        run()
+
+def model_unavailable(*names):
+    """
+    İstenen modellerden biri hazır değilse (yanıt, durum kodu) döndürür
+    """
+    with readiness_lock:
+        states = {name: readiness['models'][name] for name in names}
+    if all(state == 'ready' for state in states.values()):
+        return None
+    return jsonify({'error': 'Models are not ready', 'models': states}), 503
+
+def reinit_after_fork():
+    """
+    Pre-fork worker'da (serve.py) fork sonrası çağrılır; thread ve SQLite
+    bağlantısı gibi süreçler arası paylaşılamayan durumu yeniler.
+    Model ağırlıkları copy-on-write olarak ebeveynle paylaşılmaya devam eder;
+    ONNX oturumları ise worker'ın thread sayısıyla burada yeniden açılır.
+    """
+    for detector in language_detectors.values():
+        model = detector['model']
+        if hasattr(model, 'reset_session'):
+            model.reset_session(torch.get_num_threads())
+            if WARMUP_ENABLED:
+                batch_sentence_perplexities(WARMUP_TEXTS, model, detector['tokenizer'], detector['device'])
+        if detector['scheduler'] is not None:
+            detector['scheduler'].reset()
+    if result_cache is not None:
+        result_cache.reopen()
+
+def model_identity(model):
+    """
+    Modelin kimliği: hem metrik etiketi hem sonuç cache'i anahtarı olarak
+    kullanılır, ikisi aynı kaynaktan türesin
+    """
+    return getattr(model, 'backend_id', None) or getattr(model.config, '_name_or_path', None) or 'unknown'
+
+def reference_corpus():
+    """
+    (texts, labels): REFERENCE_CORPUS_PATH verilmişse oradan, yoksa gömülü listelerden
+    """
+    if REFERENCE_CORPUS_PATH:
+        return read_corpus(REFERENCE_CORPUS_PATH)
+    texts = AI_REFERENCE_TEXTS + HUMAN_REFERENCE_TEXTS
+    labels = [LABELS.index('ai')] * len(AI_REFERENCE_TEXTS) + [LABELS.index('human')] * len(HUMAN_REFERENCE_TEXTS)
+    return texts, np.asarray(labels, dtype=np.int8)
+
+def reference_index_path(model_name, digest):
+    """
+    Model adı ve korpus hash'i ile anahtarlanmış indeks dizini
+    """
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', model_name)
+    return os.path.join(REFERENCE_EMBEDDING_DIR, f"{safe_name}-{digest}")
+
+def build_reference_index():
+    """
+    Referans kNN indeksini diskten (mmap) açar; yoksa ya da IVF modu istenip
+    indekste küme yoksa bir kez oluşturup kaydeder.
+    """
+    global reference_index
+    texts, labels = reference_corpus()
+    path = reference_index_path(EMBEDDING_MODEL_NAME, corpus_digest(texts, labels))
+    index = None
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        try:
+            index = ReferenceIndex.load(path)
+        except (OSError, ValueError) as e:
+            logging.warning(f"⚠️ Could not read reference index from {path}: {e}")
+
+    needs_ivf = REFERENCE_INDEX_MODE == 'ivf' and (index is None or not index.has_ivf)
+    if index is None:
+        logging.info(f"Building reference index for {len(texts)} texts...")
+        index = ReferenceIndex.build(
+            lambda batch: embedding_model.encode(batch, batch_size=EMBEDDING_BATCH_SIZE), texts, labels
+        )
+    if needs_ivf:
+        index.train_ivf(REFERENCE_IVF_LISTS or None)
+    if needs_ivf or not os.path.exists(os.path.join(path, 'meta.json')):
+        try:
+            index.save(path)
+            # Kaydedilen matrisi mmap ile yeniden aç (pre-fork worker'lar paylaşsın)
+            index = ReferenceIndex.load(path)
+        except OSError as e:
+            logging.warning(f"⚠️ Could not persist reference index to {path}: {e}")
+
+    reference_index = index
+    counts = index.stats()['labels']
+    logging.info(f"✅ Reference index ready ({counts['ai']} AI, {counts['human']} human, mode={REFERENCE_INDEX_MODE}).")
+
+EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', '32'))
+
+def embedding_cache_model_id():
+    """
+    Embedding skorlarının cache kimliği: ham skorlar referans korpusuna, kNN
+    ayarlarına ve ivf modunda küme sayısı ile nprobe'a da bağlı
+    """
+    model_id = f"{EMBEDDING_MODEL_NAME}@{reference_index.digest}:knn{REFERENCE_KNN_K}:{REFERENCE_INDEX_MODE}"
+    if REFERENCE_INDEX_MODE == 'ivf':
+        n_lists = len(reference_index.centroids) if reference_index.has_ivf else 0
+        model_id += f":lists{n_lists}:nprobe{REFERENCE_IVF_NPROBE}"
+    return model_id
 
+def embedding_similarity_stats(input_embeddings):
+    """
+    Normalize girdi embedding'lerini (n x d) referans indeksinde kNN ile arar;
+    her satır için threshold'dan bağımsız ham skorları döndürür.
+    """
+    if reference_index is None:
+        build_reference_index()
+
+    ai_label, human_label = LABELS.index('ai'), LABELS.index('human')
+    nprobe = REFERENCE_IVF_NPROBE if REFERENCE_INDEX_MODE == 'ivf' else None
+    with stage('similarity'):
+        neighbor_scores, neighbor_rows, label_max = reference_index.search(input_embeddings, REFERENCE_KNN_K, nprobe)
+        # Ortalama benzerlik = sorgu · etiket ortalama vektörü (tüm referanslar üzerinden, O(d))
+        label_avg = input_embeddings @ reference_index.label_means().T
+
+    # kNN-ağırlıklı oy: komşuların (negatif olmayan) benzerliğiyle ağırlıklı AI oranı
+    weights = np.where(np.isfinite(neighbor_scores), np.clip(neighbor_scores, 0, None), 0).astype(np.float64)
+    ai_weight = (weights * (reference_index.labels[neighbor_rows] == ai_label)).sum(axis=1)
+    total_weight = weights.sum(axis=1)
+    ai_scores = np.divide(ai_weight, total_weight, out=np.full_like(ai_weight, 0.5), where=total_weight > 0)
+
+    # En yüksek ve ortalama benzerlik skorları
+    max_ai = label_max[:, ai_label].astype(np.float64)
+    max_human = label_max[:, human_label].astype(np.float64)
+    avg_ai = label_avg[:, ai_label].astype(np.float64)
+    avg_human = label_avg[:, human_label].astype(np.float64)
+
+    return [
+        {
+            "ai_score": float(ai_scores[i]),
+            "max_ai_similarity": float(max_ai[i]),
+            "max_human_similarity": float(max_human[i]),
+            "avg_ai_similarity": float(avg_ai[i]),
+            "avg_human_similarity": float(avg_human[i]),
+        }
+        for i in range(input_embeddings.shape[0])
+    ]
+
+def embedding_score_info():
+    """
+    ai_probability'nin nasıl hesaplandığını yanıtta belirtir. Eskiden
+    max_ai / (max_ai + max_human) oranıydı (pratikte 0.5 civarında); artık en
+    yakın knn_k referansın benzerlik-ağırlıklı AI oy oranı, 0-1 aralığını
+    kullanır. threshold'lar (0.75 / 0.65) bu oy oranına uygulanır.
+    """
+    return {"score_method": "knn_vote", "knn_k": REFERENCE_KNN_K}
+
+def embedding_result(stats, threshold):
+    """Ham benzerlik skorlarından API sonuç sözlüğünü üretir"""
+    ai_score = stats["ai_score"]
+    return {
+        # kNN-ağırlıklı AI oy oranı, bkz. embedding_score_info
+        "ai_probability": round(ai_score, 4),
+        "max_ai_similarity": round(stats["max_ai_similarity"], 4),
+        "max_human_similarity": round(stats["max_human_similarity"], 4),
+        "avg_ai_similarity": round(stats["avg_ai_similarity"], 4),
+        "avg_human_similarity": round(stats["avg_human_similarity"], 4),
+        "is_ai": ai_score > threshold,
+        # Oy farkı: komşuların hepsi aynı etiketteyse 1, oylar eşitse 0
+        "confidence": round(abs(ai_score - 0.5) * 2, 4),
+        **embedding_score_info()
+    }
+
+def score_embeddings(input_embeddings, threshold):
+    return [embedding_result(stats, threshold) for stats in embedding_similarity_stats(input_embeddings)]
+
+@instrument('embedding_based_ai_detection')
 def embedding_based_ai_detection(text, threshold=0.75):
     """
-    Embedding + Kosinüs benzerliği tabanlı AI detection
+    Embedding + referans korpusunda kNN-ağırlıklı kosinüs benzerliği tabanlı AI detection
     """
     if not embedding_model:
         return {"error": "Embedding model not loaded"}, 500
         
     try:
         # Input text'i embedding'e çevir
-        input_embedding = embedding_model.encode([text])
-        
-        # AI reference texts'lerin embedding'leri
-        ai_embeddings = embedding_model.encode(AI_REFERENCE_TEXTS)
-        
-        # Human reference texts'lerin embedding'leri  
-        human_embeddings = embedding_model.encode(HUMAN_REFERENCE_TEXTS)
-        
-        # Kosinüs benzerliği hesapla
-        ai_similarities = cosine_similarity(input_embedding, ai_embeddings)[0]
-        human_similarities = cosine_similarity(input_embedding, human_embeddings)[0]
-        
-        # En yüksek benzerlik skorları
-        max_ai_similarity = float(np.max(ai_similarities))
-        max_human_similarity = float(np.max(human_similarities))
-        avg_ai_similarity = float(np.mean(ai_similarities))
-        avg_human_similarity = float(np.mean(human_similarities))
-        
-        # AI probability hesapla
-        ai_score = max_ai_similarity / (max_ai_similarity + max_human_similarity)
+        with stage('embedding_encode'):
+            input_embedding = normalize_rows(embedding_model.encode([text]))
+        result = score_embeddings(input_embedding, threshold)[0]
         
         logging.info(f"🔍 Embedding AI Detection:")
-        logging.info(f"   Max AI similarity: {max_ai_similarity:.3f}")
-        logging.info(f"   Max Human similarity: {max_human_similarity:.3f}")
-        logging.info(f"   AI Score: {ai_score:.3f}")
+        logging.info(f"   Max AI similarity: {result['max_ai_similarity']:.3f}")
+        logging.info(f"   Max Human similarity: {result['max_human_similarity']:.3f}")
+        logging.info(f"   AI Score: {result['ai_probability']:.3f}")
         
-        return {
-            "ai_probability": round(ai_score, 4),
-            "max_ai_similarity": round(max_ai_similarity, 4),
-            "max_human_similarity": round(max_human_similarity, 4),
-            "avg_ai_similarity": round(avg_ai_similarity, 4),
-            "avg_human_similarity": round(avg_human_similarity, 4),
-            "is_ai": ai_score > threshold,
-            "confidence": round(abs(ai_score - 0.5) * 2, 4)  # 0-1 arasında confidence
-        }
+        return result
         
     except Exception as e:
         logging.error(f"❌ Embedding detection error: {e}")
         return {"error": str(e)}, 500
 
-def paragraph_level_embedding_detection(text, threshold=0.65):
+def batch_embedding_ai_detection(texts, threshold=0.75, batch_size=None):
     """
-    Paragraf bazında embedding detection
+    Birden fazla metni tek bir encode çağrısı ve tek bir matris çarpımıyla skorlar.
+    Sonuçlar girdi sırasıyla döner.
+    """
+    if not texts:
+        return []
+
+    def compute(missing_texts):
+        BATCH_SIZE.observe(len(missing_texts), model=EMBEDDING_MODEL_NAME)
+        with stage('embedding_encode'):
+            input_embeddings = normalize_rows(embedding_model.encode(
+                missing_texts, batch_size=batch_size or EMBEDDING_BATCH_SIZE
+            ))
+        return embedding_similarity_stats(input_embeddings)
+
+    if result_cache is not None:
+        # Ham skorlar referans korpusuna ve kNN ayarlarına da bağlı; anahtara girerler
+        if reference_index is None:
+            build_reference_index()
+        stats = result_cache.get_or_compute('embedding', texts, embedding_cache_model_id(), compute)
+    else:
+        stats = compute(texts)
+    return [embedding_result(item, threshold) for item in stats]
+
+def embedding_paragraphs(text):
+    """
+    Embedding detection için skorlanacak paragraflar (çok kısalar atlanır)
     """
     paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
     if not paragraphs:
         paragraphs = [text]
     
+    # Çok kısa paragrafları atla
+    return [p for p in paragraphs if len(p.strip()) >= 20]
+
+def budget_embedding_paragraphs(paragraphs, budget):
+    """Embedding tokenizer'ına göre token bütçesine sığan paragraf ön eki"""
+    if budget is None or budget.max_tokens is None or not paragraphs or not embedding_model:
+        return paragraphs
+    with stage('tokenize'):
+        token_counts = [len(ids) for ids in embedding_model.tokenizer(paragraphs)["input_ids"]]
+    return paragraphs[:budget.admit_prefix(token_counts)]
+
+@instrument('paragraph_level_embedding_detection')
+def paragraph_level_embedding_detection(text, threshold=0.65, budget=None):
+    """
+    Paragraf bazında embedding detection
+    """
+    paragraphs = budget_embedding_paragraphs(embedding_paragraphs(text), budget)
+
     results = []
-    scores = []
-    
-    for paragraph in paragraphs:
-        if len(paragraph.strip()) < 20:  # Çok kısa paragrafları atla
-            continue
-            
-        result = embedding_based_ai_detection(paragraph, threshold)
-        if "error" not in result:
+    if paragraphs and embedding_model:
+        scored = []
+        # Deadline varsa paragrafları batch'ler halinde, aralarda kontrol ederek skorla
+        chunk_size = EMBEDDING_BATCH_SIZE if budget is not None and budget.deadline_seconds is not None else len(paragraphs)
+        for start in range(0, len(paragraphs), chunk_size):
+            if budget is not None and budget.expired():
+                break
+            try:
+                scored.extend(batch_embedding_ai_detection(paragraphs[start:start + chunk_size], threshold))
+            except Exception as e:
+                logging.error(f"❌ Embedding detection error: {e}")
+                break
+        for paragraph, result in zip(paragraphs, scored):
             results.append({
                 "paragraph": paragraph,  # Kısaltma yapmayalım, tam metni gönderelim
                 "ai_probability": result["ai_probability"],
                 "is_ai": result["is_ai"],
                 "confidence": result["confidence"]
             })
-            scores.append(result["ai_probability"])
+    scores = [r["ai_probability"] for r in results]
     
     # Overall AI probability
     overall_ai_probability = float(np.mean(scores)) if scores else 0.0
     
     return {
         "overall_ai_probability": round(overall_ai_probability, 4),
+        **embedding_score_info(),
         "paragraphs": [r["paragraph"] for r in results],
-        "scores": [r["ai_probability"] for r in results],
-        "detailed_results": results
+        "scores": scores,
+        "detailed_results": results,
+        **(budget.summary() if budget is not None else {'truncated': False})
     }
 
+# Tek geçişli cümle bölücü. Eski iç içe niceleyicili regex ile birebir aynı
+# bölmeyi yapar: cümle, nokta/ünlem/soru ya da boşluk olmayan bir karakterle
+# başlar ve arkasından (isteğe bağlı tırnak +) boşluk ya da metin sonu gelen
+# ilk [.!?] ile biter; böyle bir işaret yoksa metnin sonuna kadar sürer.
+SENTENCE_START = re.compile(r'[^.!?\s]')
+SENTENCE_END = re.compile(r'[.!?](?=[\'"]?\s|$)')
+SENTENCE_QUOTES = '\'"'
+
+def custom_sentence_spans(text):
+    """
+    Cümleleri (start, end, sentence) olarak döndürür; text[start:end] == sentence.
+    Her karaktere en fazla sabit sayıda bakılır (doğrusal süre).
+    """
+    spans = []
+    position = 0
+    length = len(text)
+    while True:
+        start_match = SENTENCE_START.search(text, position)
+        if start_match is None:
+            break
+        start = start_match.start()
+        end_match = SENTENCE_END.search(text, start + 1)
+        if end_match is None:
+            end = length
+        else:
+            end = end_match.end()
+            if end < length and text[end] in SENTENCE_QUOTES:
+                end += 1
+        position = end
+        while text[end - 1].isspace():
+            end -= 1
+        spans.append((start, end, text[start:end]))
+    return spans
+
+@instrument('custom_sentence_tokenizer')
 def custom_sentence_tokenizer(text):
-    # This regex handles various sentence endings and keeps them with the sentence.
-    matches = re.finditer(r'[^.!?\s][^.!?]*(?:[.!?](?![\'"]?\s|$)[^.!?]*)*[.!?]?[\'"]?(?=\s|$)', text)
-    return [match.group(0).strip() for match in matches]
+    return [sentence for _, _, sentence in custom_sentence_spans(text)]
+
+# Tek forward pass'te skorlanacak cümle sayısı
+DETECT_BATCH_SIZE = int(os.environ.get('DETECT_BATCH_SIZE', '16'))
+
+def sentence_perplexity(sentence, model, hf_tokenizer, device):
+    """
+    Tek bir cümlenin perplexity'si (referans, cümle başına bir forward pass)
+    """
+    inputs = hf_tokenizer(sentence, return_tensors="pt").to(device)
+    with torch.no_grad():
+        outputs = model(**inputs, labels=inputs["input_ids"])
+        loss = outputs.loss
+        return torch.exp(loss).item()
+
+def batch_sentence_perplexities(sentences, model, hf_tokenizer, device, batch_size=None):
+    """
+    Cümleleri uzunluğa göre sıralayıp padding'li batch'ler halinde skorlar.
+    Her cümle için token başına NLL ortalamasından perplexity döndürür
+    (sentence_perplexity ile aynı değerler, girdi sırasıyla).
+    """
+    batch_size = batch_size or DETECT_BATCH_SIZE
+    max_length = getattr(model.config, 'n_positions', None)
+    with stage('tokenize'):
+        encoded = [
+            hf_tokenizer(sentence, truncation=max_length is not None, max_length=max_length)["input_ids"]
+            for sentence in sentences
+        ]
+    model_label = model_identity(model)
+    pad_id = hf_tokenizer.pad_token_id
+    if pad_id is None:
+        pad_id = hf_tokenizer.eos_token_id if hf_tokenizer.eos_token_id is not None else 0
 
-def sentence_level_detection(text, model, hf_tokenizer, device, threshold=50.0):
+    perplexities = [float('nan')] * len(sentences)
+    # Benzer uzunluktaki cümleler aynı batch'e düşsün ki padding az olsun
+    order = sorted(range(len(encoded)), key=lambda i: len(encoded[i]))
+    for start in range(0, len(order), batch_size):
+        bucket = order[start:start + batch_size]
+        width = max(len(encoded[i]) for i in bucket)
+        input_ids = torch.full((len(bucket), width), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(bucket), width), dtype=torch.long)
+        for row, i in enumerate(bucket):
+            ids = encoded[i]
+            input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, :len(ids)] = 1
+        input_ids = input_ids.to(device)
+        attention_mask = attention_mask.to(device)
+
+        BATCH_SIZE.observe(len(bucket), model=model_label)
+        TOKENS_PROCESSED.inc(sum(len(encoded[i]) for i in bucket), model=model_label)
+        with stage('forward'), torch.no_grad():
+            logits = model(input_ids=input_ids, attention_mask=attention_mask).logits
+            # Sağa padding: pozisyonlar tekil forward pass ile aynı kalır
+            shift_logits = logits[:, :-1, :].float()
+            shift_labels = input_ids[:, 1:]
+            shift_mask = attention_mask[:, 1:].float()
+            token_nll = torch.nn.functional.cross_entropy(
+                shift_logits.reshape(-1, shift_logits.size(-1)),
+                shift_labels.reshape(-1),
+                reduction='none'
+            ).view(shift_labels.shape)
+            mean_nll = (token_nll * shift_mask).sum(dim=1) / shift_mask.sum(dim=1)
+            batch_perplexities = torch.exp(mean_nll).tolist()
+
+        for row, i in enumerate(bucket):
+            perplexities[i] = batch_perplexities[row]
+    return perplexities
+
+def line_offsets(text):
+    """
+    text.splitlines() ile dönen her satırın text içindeki başlangıç indeksi
+    """
+    offsets = []
+    position = 0
+    for line in text.splitlines(keepends=True):
+        offsets.append(position)
+        position += len(line)
+    return offsets
+
+def split_title_and_paragraphs(text):
+    """
+    İlk boş olmayan satırı başlık, kalan satırları paragraf olarak döndürür
+    """
     lines = text.splitlines()
     
     # Find the first non-empty line as the title
@@ -180,79 +728,832 @@ def sentence_level_detection(text, model, hf_tokenizer, device, threshold=50.0):
             first_paragraph_index = i + 1
             break
             
-    paragraphs = lines[first_paragraph_index:]
-    results = []
-    all_scores = []
+    return title, lines[first_paragraph_index:]
 
+@instrument('segmentation')
+def segment_paragraphs(paragraphs):
+    """
+    Her paragrafı (start, end, sentence) cümle span'lerine ayırır;
+    boş satırlar için None döner
+    """
+    segmented = []
     for paragraph in paragraphs:
         if not paragraph.strip():
-            # Keep empty lines between paragraphs for structure
-            results.append({'paragraph': [{'text': '', 'is_ai': False, 'confidence': 0}]})
+            segmented.append(None)
             continue
-        
-        sentences = custom_sentence_tokenizer(paragraph)
-        paragraph_result = []
-        
-        for sentence in sentences:
-            if not sentence.strip():
-                continue
-            
-            inputs = hf_tokenizer(sentence, return_tensors="pt").to(device)
-            with torch.no_grad():
-                outputs = model(**inputs, labels=inputs["input_ids"])
-                loss = outputs.loss
-                perplexity = torch.exp(loss).item()
-
-            score = min(perplexity, 100.0)
-            all_scores.append(score)
-            
-            paragraph_result.append({
-                'text': sentence,
-                'is_ai': bool(score > threshold),
-                'confidence': round(score, 2)
-            })
-        results.append({'paragraph': paragraph_result})
+        segmented.append([span for span in custom_sentence_spans(paragraph) if span[2].strip()])
+    return segmented
+
+# Uzun dokümanlarda kayan pencerenin adımı (token)
+DOCUMENT_STRIDE = int(os.environ.get('DOCUMENT_STRIDE', '512'))
+
+def document_token_nll(text, model, hf_tokenizer, device, stride=None):
+    """
+    Dokümanı tek seferde (gerekirse kayan pencereyle) skorlar.
+    (offset_mapping, token_nll) döndürür; token_nll[t], t. token'ın önceki
+    bağlam verildiğinde negatif log olasılığıdır (ilk token için NaN).
+    """
+    with stage('tokenize'):
+        encoding = hf_tokenizer(text, return_offsets_mapping=True)
+    ids = encoding["input_ids"]
+    offsets = np.asarray(encoding["offset_mapping"], dtype=np.int64).reshape(-1, 2)
+    n_tokens = len(ids)
+    token_nll = np.full(n_tokens, np.nan, dtype=np.float64)
+    if n_tokens < 2:
+        return offsets, token_nll
+
+    max_length = model.config.n_positions
+    stride = max(1, min(stride or DOCUMENT_STRIDE, max_length))
+    ids_tensor = torch.tensor(ids, dtype=torch.long)
+
+    begin = 0
+    scored_until = 1  # token 0'ın öncesinde bağlam yok
+    while True:
+        end = min(begin + max_length, n_tokens)
+        window = ids_tensor[begin:end].unsqueeze(0).to(device)
+        BATCH_SIZE.observe(1, model=model_identity(model))
+        TOKENS_PROCESSED.inc(end - begin, model=model_identity(model))
+        with stage('forward'), torch.no_grad():
+            logits = model(input_ids=window).logits[0, :-1, :].float()
+            nll = torch.nn.functional.cross_entropy(logits, window[0, 1:], reduction='none')
+        # nll[k] -> token begin + k + 1; pencereler çakışırsa yalnızca yeni token'ları al
+        first = max(scored_until, begin + 1)
+        token_nll[first:end] = nll[first - begin - 1:end - begin - 1].cpu().numpy()
+        scored_until = end
+        if end == n_tokens:
+            break
+        begin += stride
+    return offsets, token_nll
+
+def attribute_token_nll(offsets, token_nll, spans):
+    """
+    Token NLL'lerini, son karakterinin düştüğü cümle span'ine atar ve her span
+    için perplexity döndürür (token düşmeyen span'ler için NaN).
+    """
+    if not spans:
+        return []
+    starts = np.array([start for start, _ in spans], dtype=np.int64)
+    ends = np.array([end for _, end in spans], dtype=np.int64)
+    last_char = offsets[:, 1] - 1
+    span_index = np.searchsorted(starts, last_char, side='right') - 1
+    clipped = np.clip(span_index, 0, len(spans) - 1)
+    valid = (
+        (span_index >= 0)
+        & (offsets[:, 1] > offsets[:, 0])
+        & (last_char < ends[clipped])
+        & ~np.isnan(token_nll)
+    )
+    sums = np.bincount(span_index[valid], weights=token_nll[valid], minlength=len(spans))
+    counts = np.bincount(span_index[valid], minlength=len(spans))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        perplexities = np.exp(sums / counts)
+    perplexities[counts == 0] = np.nan
+    return perplexities.tolist()
+
+def document_sentence_perplexities(text, doc_spans, model, hf_tokenizer, device, stride=None, batch_size=None):
+    """
+    Doküman modunda cümle perplexity'leri: model dokümanın tamamı üzerinde bir
+    kez çalışır, her cümle gerçek önceki bağlamıyla skorlanır. Kendisine token
+    düşmeyen cümleler tekil batch skorlamaya düşer.
+    """
+    offsets, token_nll = document_token_nll(text, model, hf_tokenizer, device, stride)
+    perplexities = attribute_token_nll(offsets, token_nll, [(s, e) for s, e, _ in doc_spans])
+    missing = [i for i, ppl in enumerate(perplexities) if np.isnan(ppl)]
+    if missing:
+        fallback = batch_sentence_perplexities(
+            [doc_spans[i][2] for i in missing], model, hf_tokenizer, device, batch_size
+        )
+        for i, ppl in zip(missing, fallback):
+            perplexities[i] = ppl
+    return perplexities
+
+def build_paragraph_result(sentences, perplexities, threshold):
+    """
+    Cümle perplexity'lerinden paragraf sonucunu ve skor listesini üretir
+    """
+    paragraph_result = []
+    scores = []
+    for sentence, perplexity in zip(sentences, perplexities):
+        score = min(perplexity, 100.0)
+        scores.append(score)
+        paragraph_result.append({
+            'text': sentence,
+            'is_ai': bool(score > threshold),
+            'confidence': round(score, 2)
+        })
+    return paragraph_result, scores
+
+def empty_paragraph_result():
+    # Keep empty lines between paragraphs for structure
+    return {'paragraph': [{'text': '', 'is_ai': False, 'confidence': 0}]}
+
+# /api/detect skorlama modları
+DETECTION_MODES = ('sentence', 'document', 'incremental')
+
+# incremental modda cache'te tutulacak en fazla önceki bağlam token'ı
+INCREMENTAL_CONTEXT_TOKENS = int(os.environ.get('INCREMENTAL_CONTEXT_TOKENS', '512'))
+
+def incremental_paragraph_perplexities(paragraph, spans, model, hf_tokenizer, device, context_tokens=None):
+    """
+    Paragrafı soldan sağa yürür: her cümle, önceki cümlelerin past_key_values
+    cache'i ile beslenir ve perplexity yalnızca kendi yeni token'larından alınır.
+    Bağlam context_tokens'ı aşınca son yarısı tek forward pass'le yeniden
+    kodlanır; toplam iş paragraf uzunluğunda doğrusal kalır.
+    """
+    if not getattr(model, 'supports_past_key_values', True):
+        raise ValueError("incremental mode is not supported by this backend")
+    budget = max(2, min(context_tokens or INCREMENTAL_CONTEXT_TOKENS, model.config.n_positions))
+
+    context_ids = []
+    past = None
+    last_logits = None
+    previous_end = 0
+    perplexities = []
+    for start, end, sentence in spans:
+        # İlk cümleden sonra aradaki boşluklar da yeni token'lara dahil
+        piece = paragraph[previous_end:end] if context_ids else sentence
+        previous_end = end
+        with stage('tokenize'):
+            new_ids = hf_tokenizer(piece)["input_ids"][:budget]
+
+        if len(context_ids) + len(new_ids) > budget:
+            keep = max(0, min(budget // 2, budget - len(new_ids)))
+            context_ids = context_ids[len(context_ids) - keep:] if keep else []
+            past = None
+            last_logits = None
+            if context_ids:
+                TOKENS_PROCESSED.inc(len(context_ids), model=model_identity(model))
+                with stage('forward'), torch.no_grad():
+                    outputs = model(input_ids=torch.tensor([context_ids], device=device), use_cache=True)
+                past = outputs.past_key_values
+                last_logits = outputs.logits[0, -1]
+
+        TOKENS_PROCESSED.inc(len(new_ids), model=model_identity(model))
+        with stage('forward'), torch.no_grad():
+            outputs = model(input_ids=torch.tensor([new_ids], device=device), past_key_values=past, use_cache=True)
+            logits = outputs.logits[0]
+            targets = torch.tensor(new_ids, device=logits.device)
+            if last_logits is not None:
+                # Yeni ilk token, bağlamın son pozisyonundan tahmin edilir
+                prediction_logits = torch.cat([last_logits[None, :], logits[:-1]], dim=0)
+            else:
+                prediction_logits = logits[:-1]
+                targets = targets[1:]
+            if len(targets):
+                nll = torch.nn.functional.cross_entropy(prediction_logits.float(), targets)
+                perplexities.append(torch.exp(nll).item())
+            else:
+                perplexities.append(float('nan'))
+
+        past = outputs.past_key_values
+        last_logits = logits[-1]
+        context_ids.extend(new_ids)
+    return perplexities
+
+def scheduler_timeout(budget):
+    """
+    Scheduler'da beklenecek süre: isteğin kalan deadline'ı, en fazla
+    SCHEDULER_SUBMIT_TIMEOUT. Deadline geçmişse TimeoutError.
+    """
+    remaining = budget.remaining_seconds() if budget is not None else None
+    if remaining is None:
+        return SCHEDULER_SUBMIT_TIMEOUT or None
+    if remaining <= 0:
+        raise TimeoutError('request deadline passed before scoring')
+    return min(remaining, SCHEDULER_SUBMIT_TIMEOUT) if SCHEDULER_SUBMIT_TIMEOUT else remaining
+
+def cached_sentence_perplexities(sentences, model, hf_tokenizer, device, batch_size=None, scheduler=None,
+                                 budget=None):
+    """
+    Bağlamsız cümle perplexity'leri; scheduler ve sonuç cache'i üzerinden.
+    Scheduler sonucu scheduler_timeout(budget) içinde gelmezse TimeoutError.
+    """
+    def compute(missing):
+        if scheduler is not None:
+            # Diğer isteklerin cümleleriyle aynı forward pass'te skorlanır
+            return scheduler.submit(missing, timeout=scheduler_timeout(budget))
+        return batch_sentence_perplexities(missing, model, hf_tokenizer, device, batch_size)
+
+    # Bağlamsız perplexity yalnızca cümleye bağlı; cache'lenebilir
+    if result_cache is not None:
+        return result_cache.get_or_compute('perplexity', sentences, model_identity(model), compute)
+    return compute(sentences)
+
+def apply_token_budget(segmented, token_counts, budget):
+    """
+    Bütçeye sığan ilk cümleleri tutacak şekilde segmented listesini kırpar:
+    sığmayan cümlenin paragrafı kısmen, sonraki paragraflar hiç dönmez.
+    """
+    admitted = budget.admit_prefix(token_counts)
+    if admitted == len(token_counts):
+        return segmented
+    kept = []
+    remaining = admitted
+    for spans in segmented:
+        if spans is None:
+            kept.append(None)
+            continue
+        if remaining < len(spans):
+            if remaining:
+                kept.append(spans[:remaining])
+            break
+        kept.append(spans)
+        remaining -= len(spans)
+    return kept
+
+def iter_sentence_level_detection(text, model, hf_tokenizer, device, threshold=50.0, batch_size=None,
+                                  mode='sentence', scheduler=None, per_paragraph=False, context_tokens=None,
+                                  budget=None):
+    """
+    Sonuçları kayıt kayıt üretir: önce {'type': 'title'}, sonra her paragraf için
+    {'type': 'paragraph'}, en sonda {'type': 'summary'}. per_paragraph=True ise
+    (sentence modunda) her paragraf kendi batch'iyle skorlanıp hemen döner.
+    budget (RequestBudget) verilirse token bütçesini aşan cümleler skorlanmaz,
+    deadline geçince kalan paragraflar atlanır ve özet truncated: true taşır.
+    """
+    if mode not in DETECTION_MODES:
+        raise ValueError(f"Unknown detection mode: {mode}")
+    title, paragraphs = split_title_and_paragraphs(text)
+    segmented = segment_paragraphs(paragraphs)
+    if budget is not None and budget.max_tokens is not None:
+        flat_sentences = [sentence for spans in segmented if spans for _, _, sentence in spans]
+        with stage('tokenize'):
+            token_counts = [len(ids) for ids in hf_tokenizer(flat_sentences)["input_ids"]] if flat_sentences else []
+        segmented = apply_token_budget(segmented, token_counts, budget)
+    yield {'type': 'title', 'title': title}
+
+    perplexities = None
+    if mode == 'document':
+        # Paragraf içi span'leri doküman karakter indekslerine çevir
+        first_paragraph_index = len(text.splitlines()) - len(paragraphs)
+        paragraph_offsets = line_offsets(text)[first_paragraph_index:]
+        doc_spans = [
+            (offset + start, offset + end, sentence)
+            for offset, spans in zip(paragraph_offsets, segmented) if spans
+            for start, end, sentence in spans
+        ]
+        if budget is not None and budget.truncated and doc_spans:
+            # Bütçe dışındaki metni modele hiç verme
+            text = text[:doc_spans[-1][1]]
+        perplexities = document_sentence_perplexities(text, doc_spans, model, hf_tokenizer, device, batch_size=batch_size)
+
+    # sentence modunda kaç cümle birlikte skorlanır: paragraf başına, deadline
+    # varsa batch boyutu kadar (aralarda deadline kontrolü), yoksa hepsi birden
+    if per_paragraph:
+        chunk_sentences = 1
+    elif budget is not None and budget.deadline_seconds is not None:
+        chunk_sentences = batch_size or DETECT_BATCH_SIZE
+    else:
+        chunk_sentences = float('inf')
+
+    all_scores = []
+    offset = 0
+    chunk_results = {}
+    for index, spans in enumerate(segmented):
+        if budget is not None and budget.expired():
+            break
+        if spans is None:
+            yield {'type': 'paragraph', 'index': index, **empty_paragraph_result()}
+            continue
+        sentences = [sentence for _, _, sentence in spans]
+        if mode == 'incremental':
+            paragraph_perplexities = incremental_paragraph_perplexities(
+                paragraphs[index], spans, model, hf_tokenizer, device, context_tokens
+            )
+        elif perplexities is not None:
+            paragraph_perplexities = perplexities[offset:offset + len(sentences)]
+            offset += len(sentences)
+        else:
+            if index not in chunk_results:
+                # Bu paragraftan başlayarak en az chunk_sentences cümle topla
+                chunk = []
+                chunk_size = 0
+                for j in range(index, len(segmented)):
+                    if segmented[j]:
+                        chunk.append(j)
+                        chunk_size += len(segmented[j])
+                    if chunk_size >= chunk_sentences:
+                        break
+                chunk_flat = [sentence for j in chunk for _, _, sentence in segmented[j]]
+                try:
+                    chunk_perplexities = cached_sentence_perplexities(
+                        chunk_flat, model, hf_tokenizer, device, batch_size, scheduler, budget=budget
+                    )
+                except TimeoutError:
+                    # İsteğin deadline'ı dolduysa kısmi sonuç; aksi halde 503
+                    if budget is not None and budget.expired():
+                        break
+                    raise
+                position = 0
+                for j in chunk:
+                    chunk_results[j] = chunk_perplexities[position:position + len(segmented[j])]
+                    position += len(segmented[j])
+            paragraph_perplexities = chunk_results.pop(index, [])
+        paragraph_result, scores = build_paragraph_result(sentences, paragraph_perplexities, threshold)
+        all_scores.extend(scores)
+        yield {'type': 'paragraph', 'index': index, 'paragraph': paragraph_result}
 
     overall_score = np.mean(all_scores) if all_scores else 0
-    return {'title': title, 'results': results, 'overall_score': round(overall_score, 2)}
+    yield {
+        'type': 'summary',
+        'overall_score': round(overall_score, 2),
+        **(budget.summary() if budget is not None else {'truncated': False})
+    }
+
+@instrument('sentence_level_detection')
+def sentence_level_detection(text, model, hf_tokenizer, device, threshold=50.0, batch_size=None, mode='sentence',
+                             scheduler=None, context_tokens=None, budget=None):
+    response = {'title': '', 'results': [], 'overall_score': 0}
+    for record in iter_sentence_level_detection(text, model, hf_tokenizer, device, threshold, batch_size, mode,
+                                                scheduler, context_tokens=context_tokens, budget=budget):
+        if record['type'] == 'title':
+            response['title'] = record['title']
+        elif record['type'] == 'paragraph':
+            response['results'].append({'paragraph': record['paragraph']})
+        else:
+            record.pop('type')
+            response.update(record)
+    return response
+
+# /api/detect/batch için daha büyük batch'ler ve doküman sınırı
+BULK_BATCH_SIZE = int(os.environ.get('BULK_BATCH_SIZE', '64'))
+BULK_MAX_DOCUMENTS = int(os.environ.get('BULK_MAX_DOCUMENTS', '1000'))
+
+def bulk_sentence_level_detection(texts, model, hf_tokenizer, device, threshold=50.0, batch_size=None, budget=None):
+    """
+    Birden fazla dokümanın tüm cümlelerini tek, uzunluğa göre sıralı iş listesinde
+    skorlar ve her doküman için sentence_level_detection ile aynı yapıyı döndürür.
+    budget verilirse token bütçesi doküman sırasıyla uygulanır; bütçe dışında
+    kalan cümleleri olan dokümanlar truncated: true döner.
+    """
+    parsed = []
+    flat_sentences = []
+    for text in texts:
+        title, paragraphs = split_title_and_paragraphs(text)
+        segmented = segment_paragraphs(paragraphs)
+        parsed.append((title, segmented))
+        flat_sentences.extend(sentence for spans in segmented if spans for _, _, sentence in spans)
+
+    admitted = len(flat_sentences)
+    if budget is not None and budget.max_tokens is not None and flat_sentences:
+        with stage('tokenize'):
+            token_counts = [len(ids) for ids in hf_tokenizer(flat_sentences)["input_ids"]]
+        admitted = budget.admit_prefix(token_counts)
+        flat_sentences = flat_sentences[:admitted]
+
+    perplexities = cached_sentence_perplexities(
+        flat_sentences, model, hf_tokenizer, device, batch_size or BULK_BATCH_SIZE
+    )
+
+    responses = []
+    offset = 0
+    for title, segmented in parsed:
+        results = []
+        all_scores = []
+        truncated = False
+        for spans in segmented:
+            if spans is None:
+                results.append(empty_paragraph_result())
+                continue
+            if offset + len(spans) > admitted:
+                truncated = True
+                spans = spans[:max(0, admitted - offset)]
+                if not spans:
+                    break
+            sentences = [sentence for _, _, sentence in spans]
+            paragraph_result, scores = build_paragraph_result(
+                sentences, perplexities[offset:offset + len(sentences)], threshold
+            )
+            offset += len(sentences)
+            all_scores.extend(scores)
+            results.append({'paragraph': paragraph_result})
+        overall_score = np.mean(all_scores) if all_scores else 0
+        responses.append({
+            'title': title, 'results': results, 'overall_score': round(overall_score, 2), 'truncated': truncated
+        })
+    return responses
+
+def iter_paragraph_embedding_detection(text, threshold=0.65, budget=None):
+    """
+    paragraph_level_embedding_detection'ın akış versiyonu: her paragraf skorlanır
+    skorlanmaz {'type': 'paragraph'} kaydı, en sonda {'type': 'summary'} üretir.
+    """
+    scores = []
+    for index, paragraph in enumerate(budget_embedding_paragraphs(embedding_paragraphs(text), budget)):
+        if not embedding_model or (budget is not None and budget.expired()):
+            break
+        try:
+            result = batch_embedding_ai_detection([paragraph], threshold)[0]
+        except Exception as e:
+            logging.error(f"❌ Embedding detection error: {e}")
+            continue
+        scores.append(result["ai_probability"])
+        yield {
+            'type': 'paragraph',
+            'index': index,
+            "paragraph": paragraph,
+            "ai_probability": result["ai_probability"],
+            "is_ai": result["is_ai"],
+            "confidence": result["confidence"]
+        }
+    overall_ai_probability = float(np.mean(scores)) if scores else 0.0
+    yield {
+        'type': 'summary',
+        'overall_ai_probability': round(overall_ai_probability, 4),
+        **embedding_score_info(),
+        **(budget.summary() if budget is not None else {'truncated': False})
+    }
+
+def stream_records(records, stream_format):
+    """
+    Kayıtları NDJSON satırları ya da SSE olayları olarak yazar
+    """
+    def encode(record):
+        payload = json.dumps(record, ensure_ascii=False)
+        if stream_format == 'sse':
+            return f"event: {record['type']}\ndata: {payload}\n\n"
+        return payload + '\n'
+
+    try:
+        for record in records:
+            yield encode(record)
+    except TimeoutError as e:
+        # Başlıklar gönderildi; 503 yerine akışı bir hata kaydıyla kapat
+        logging.warning(f"⚠️ Streamed scoring timed out: {e}")
+        yield encode({'type': 'error', 'error': 'Scoring timed out, retry later', 'status': 503})
+
+def stream_response(records):
+    """
+    ?format=sse ya da 'Accept: text/event-stream' ise SSE, aksi halde NDJSON
+    """
+    wants_sse = request.args.get('format') == 'sse' or 'text/event-stream' in request.headers.get('Accept', '')
+    stream_format = 'sse' if wants_sse else 'ndjson'
+    mimetype = 'text/event-stream' if wants_sse else 'application/x-ndjson'
+    response = Response(stream_with_context(stream_records(records, stream_format)), mimetype=mimetype)
+    # Proxy'lerin yanıtı tamponlamasını engelle
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def serialize(payload):
+    """jsonify + serileştirme süresinin ölçümü"""
+    with stage('serialize'):
+        return jsonify(payload)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or 'unknown'
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    started = g.get('request_started')
+    if started is not None:
+        detector_metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage=f'request:{endpoint}')
+    return response
+
+def admission_controlled(endpoint):
+    """
+    Endpoint'i kabul kontrolüne alır: g.budget'a istek bütçesini koyar, slot
+    alamazsa 429 + Retry-After döner. Akış cevaplarında slot, akış kapanınca bırakılır.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            limits = ENDPOINT_LIMITS[endpoint]
+            controller = admission_controllers[endpoint]
+            g.budget = RequestBudget(limits.get('max_tokens'), limits.get('deadline'))
+            timeout = controller.queue_timeout
+            if g.budget.deadline_seconds is not None:
+                timeout = min(timeout, g.budget.deadline_seconds)
+            try:
+                controller.acquire(timeout)
+            except AdmissionRejected as e:
+                logging.warning(f"⚠️ {endpoint} request rejected: {e}")
+                response = jsonify({'error': 'Server is busy, retry later', 'reason': str(e)})
+                response.headers['Retry-After'] = str(max(1, int(controller.queue_timeout)))
+                return response, 429
+            try:
+                response = make_response(fn(*args, **kwargs))
+            except TimeoutError as e:
+                # Scheduler sonucu istek süresi içinde gelmedi: aşırı yük, 503
+                controller.release()
+                logging.warning(f"⚠️ {endpoint} request timed out: {e}")
+                response = jsonify({'error': 'Scoring timed out, retry later', 'reason': str(e)})
+                response.headers['Retry-After'] = str(max(1, int(controller.queue_timeout)))
+                return response, 503
+            except BaseException:
+                controller.release()
+                raise
+            if response.is_streamed:
+                response.call_on_close(controller.release)
+            else:
+                controller.release()
+            return response
+        return wrapper
+    return decorator
+
+def collect_runtime_metrics():
+    """Cache ve scheduler durumunu /metrics yazımı sırasında okur"""
+    metrics = []
+    if result_cache is not None:
+        cache = result_cache.stats()
+        metrics.append(('detector_cache_lookups_total', 'counter', 'Result cache lookups by outcome.', [
+            ({'result': 'memory_hit'}, cache['memory_hits']),
+            ({'result': 'disk_hit'}, cache['disk_hits']),
+            ({'result': 'miss'}, cache['misses']),
+        ]))
+        metrics.append(('detector_cache_entries', 'gauge', 'Entries in the in-memory result cache.', [
+            ({}, cache['memory_entries'])
+        ]))
+    schedulers = {lang: d['scheduler'].stats() for lang, d in list(language_detectors.items()) if d['scheduler']}
+    if schedulers:
+        metrics.append(('detector_scheduler_queue_depth', 'gauge', 'Sentences waiting in the scheduler queue.', [
+            ({'language': lang}, stats['queue_depth']) for lang, stats in schedulers.items()
+        ]))
+        metrics.append(('detector_scheduler_items_total', 'counter', 'Sentences scored by the scheduler.', [
+            ({'language': lang}, stats['items_total']) for lang, stats in schedulers.items()
+        ]))
+    metrics.append(('detector_admission_rejected_total', 'counter', 'Requests shed with 429 by endpoint.', [
+        ({'endpoint': endpoint}, controller.stats()['rejected_total'])
+        for endpoint, controller in admission_controllers.items()
+    ]))
+    metrics.append(('detector_admission_active', 'gauge', 'Requests holding an admission slot by endpoint.', [
+        ({'endpoint': endpoint}, controller.stats()['active'])
+        for endpoint, controller in admission_controllers.items()
+    ]))
+    with readiness_lock:
+        metrics.append(('detector_ready', 'gauge', '1 when all models are loaded and warmed up.', [
+            ({}, 1 if readiness['state'] == 'ready' else 0)
+        ]))
+    return metrics
+
+detector_metrics.REGISTRY.register_collector(collect_runtime_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus metin formatında metrikler (süreç başına)
+    """
+    return Response(detector_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def parse_detect_options(data, model):
+    """
+    İstek gövdesindeki skorlama seçenekleri: mode ve (incremental için) context_tokens.
+    (options, error) döndürür.
+    """
+    mode = data.get('mode', 'sentence')
+    if mode not in DETECTION_MODES:
+        return None, f"mode must be one of {', '.join(DETECTION_MODES)}"
+    options = {'mode': mode}
+    if mode == 'incremental':
+        if not getattr(model, 'supports_past_key_values', True):
+            return None, f"incremental mode is not supported by the {DETECTOR_BACKEND} backend"
+        context_tokens = data.get('context_tokens')
+        if context_tokens is not None:
+            if not isinstance(context_tokens, int) or context_tokens < 2:
+                return None, 'context_tokens must be an integer >= 2'
+            options['context_tokens'] = context_tokens
+    return options, None
+
+def resolve_language(requested, text):
+    """
+    İstekte verilen dil ya da dil tanıma sonucu; tanınamayan, modeli olmayan ya
+    da güveni LANGUAGE_MIN_CONFIDENCE altında kalan diller DEFAULT_LANGUAGE'a
+    düşer. (language_info, error) döndürür.
+    """
+    if requested is not None:
+        if requested not in LANGUAGE_MODELS:
+            return None, f"language must be one of {', '.join(LANGUAGE_MODELS)}"
+        return {'language': requested, 'detected_language': None, 'language_confidence': None}, None
+    with stage('language_id'):
+        language, detected, confidence = language_identifier.route(
+            text, LANGUAGE_MODELS, DEFAULT_LANGUAGE, LANGUAGE_MIN_CONFIDENCE
+        )
+    return {'language': language, 'detected_language': detected, 'language_confidence': round(confidence, 4)}, None
+
+def routed_detector(language):
+    """
+    Dilin modeli: (detector, None) ya da (None, 503 yanıtı). Başlangıçta yüklenen
+    diller hazır olana kadar 503 döner; diğerleri ilk istekte yüklenir.
+    """
+    name = detector_state_name(language)
+    if language in PRELOAD_LANGUAGES:
+        unavailable = model_unavailable(name)
+        if unavailable:
+            return None, unavailable
+    detector = get_language_detector(language)
+    if detector is None:
+        return None, model_unavailable(name)
+    return detector, None
 
 @app.route('/api/detect', methods=['POST'])
+@admission_controlled('detect')
 def detect():
     data = request.get_json()
     text = data.get('text')
     if not text:
         return jsonify({'error': 'Text is required'}), 400
     
-    response = sentence_level_detection(text, hf_model_tr, hf_tokenizer_tr, device)
-    return jsonify(response)
+    language_info, error = resolve_language(data.get('language'), text)
+    if error:
+        return jsonify({'error': error}), 400
+    detector, unavailable = routed_detector(language_info['language'])
+    if unavailable:
+        return unavailable
+    options, error = parse_detect_options(data, detector['model'])
+    if error:
+        return jsonify({'error': error}), 400
+    
+    response = sentence_level_detection(
+        text, detector['model'], detector['tokenizer'], detector['device'], scheduler=detector['scheduler'],
+        budget=g.budget, **options
+    )
+    return serialize({**response, **language_info})
+
+@app.route('/api/detect/stream', methods=['POST'])
+@admission_controlled('detect_stream')
+def detect_stream():
+    """
+    /api/detect'in akış versiyonu: paragraf sonuçları hazır oldukça NDJSON/SSE
+    """
+    data = request.get_json()
+    text = data.get('text')
+    if not text:
+        return jsonify({'error': 'Text is required'}), 400
+    
+    language_info, error = resolve_language(data.get('language'), text)
+    if error:
+        return jsonify({'error': error}), 400
+    detector, unavailable = routed_detector(language_info['language'])
+    if unavailable:
+        return unavailable
+    options, error = parse_detect_options(data, detector['model'])
+    if error:
+        return jsonify({'error': error}), 400
+    
+    records = iter_sentence_level_detection(
+        text, detector['model'], detector['tokenizer'], detector['device'], scheduler=detector['scheduler'],
+        per_paragraph=True, budget=g.budget, **options
+    )
+    return stream_response(itertools.chain([{'type': 'language', **language_info}], records))
+
+def read_bulk_documents():
+    """
+    Doküman listesini JSON gövdesinden ({"documents": [...]}) ya da JSONL
+    yüklemesinden (multipart 'file' veya application/x-ndjson gövdesi) okur.
+    Her öğe düz metin ya da {"id": ..., "text": ...} olabilir.
+    """
+    upload = request.files.get('file')
+    if upload is not None or request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        raw = upload.read() if upload is not None else request.get_data()
+        items = [json.loads(line) for line in raw.decode('utf-8').splitlines() if line.strip()]
+    else:
+        data = request.get_json(silent=True) or {}
+        items = data.get('documents')
+        if not isinstance(items, list):
+            raise ValueError("documents must be a list")
+
+    documents = []
+    for i, item in enumerate(items):
+        if isinstance(item, str):
+            documents.append((i, item))
+        elif isinstance(item, dict) and isinstance(item.get('text'), str):
+            documents.append((item.get('id', i), item['text']))
+        else:
+            raise ValueError(f"document {i} must be a string or an object with a 'text' field")
+    return documents
+
+@app.route('/api/detect/batch', methods=['POST'])
+@admission_controlled('detect_batch')
+def detect_batch():
+    """
+    Toplu doküman endpoint'i: aynı dildeki dokümanların cümleleri birlikte skorlanır
+    """
+    try:
+        documents = read_bulk_documents()
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+    if not documents:
+        return jsonify({'error': 'At least one document is required'}), 400
+    if len(documents) > BULK_MAX_DOCUMENTS:
+        return jsonify({'error': f'At most {BULK_MAX_DOCUMENTS} documents per request'}), 400
+    
+    # Dokümanları dile göre grupla; her grup kendi modeliyle tek iş listesinde skorlanır
+    language_infos = [resolve_language(None, text)[0] for _, text in documents]
+    groups = {}
+    for i, info in enumerate(language_infos):
+        groups.setdefault(info['language'], []).append(i)
+    detectors = {}
+    for language in groups:
+        detectors[language], unavailable = routed_detector(language)
+        if unavailable:
+            return unavailable
+
+    responses = [None] * len(documents)
+    for language, indices in groups.items():
+        detector = detectors[language]
+        group_responses = bulk_sentence_level_detection(
+            [documents[i][1] for i in indices], detector['model'], detector['tokenizer'], detector['device'],
+            budget=g.budget
+        )
+        for i, response in zip(indices, group_responses):
+            responses[i] = response
+    return serialize({
+        'documents': [
+            {'id': doc_id, **response, **info}
+            for (doc_id, _), response, info in zip(documents, responses, language_infos)
+        ],
+        **g.budget.summary()
+    })
 
 @app.route('/api/embedding-detect', methods=['POST'])
+@admission_controlled('embedding_detect')
 def embedding_detect():
     """
     Embedding + Kosinüs benzerliği tabanlı AI detection endpoint
     """
+    unavailable = model_unavailable('embedding_model')
+    if unavailable:
+        return unavailable
     data = request.get_json()
     text = data.get('text')
     if not text:
         return jsonify({'error': 'Text is required'}), 400
     
     # Paragraf bazında embedding detection
-    response = paragraph_level_embedding_detection(text)
-    return jsonify(response)
+    response = paragraph_level_embedding_detection(text, budget=g.budget)
+    return serialize(response)
+
+@app.route('/api/embedding-detect/stream', methods=['POST'])
+@admission_controlled('embedding_detect_stream')
+def embedding_detect_stream():
+    """
+    /api/embedding-detect'in akış versiyonu: paragraf paragraf NDJSON/SSE
+    """
+    unavailable = model_unavailable('embedding_model')
+    if unavailable:
+        return unavailable
+    data = request.get_json()
+    text = data.get('text')
+    if not text:
+        return jsonify({'error': 'Text is required'}), 400
+    
+    return stream_response(iter_paragraph_embedding_detection(text, budget=g.budget))
+
+@app.route('/api/live', methods=['GET'])
+def live():
+    """
+    Liveness probe: süreç ayakta ve istek işleyebiliyor
+    """
+    return jsonify({'status': 'alive', 'uptime_seconds': round(time.time() - readiness['started_at'], 1)})
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """
+    Readiness probe: tüm modeller yüklenip ısındığında 200, aksi halde 503
+    """
+    with readiness_lock:
+        body = {
+            'state': readiness['state'],
+            'models': dict(readiness['models']),
+            'errors': dict(readiness['errors'])
+        }
+        if readiness['ready_at'] is not None:
+            body['startup_seconds'] = round(readiness['ready_at'] - readiness['started_at'], 2)
+    return jsonify(body), 200 if body['state'] == 'ready' else 503
 
 @app.route('/api/health', methods=['GET'])
 def health():
     """
     Servis durumunu kontrol et
     """
+    with readiness_lock:
+        state = readiness['state']
+        model_states = dict(readiness['models'])
     return jsonify({
         'status': 'healthy',
+        'state': state,
         'models_loaded': {
             'gpt2_turkish': hf_model_tr is not None,
             'embedding_model': embedding_model is not None
+        },
+        'backend': DETECTOR_BACKEND,
+        'language_models': {
+            lang: {'model': model_name, 'state': model_states.get(detector_state_name(lang), 'not_loaded')}
+            for lang, model_name in LANGUAGE_MODELS.items()
+        },
+        'scheduler': perplexity_scheduler.stats() if perplexity_scheduler else None,
+        'cache': result_cache.stats() if result_cache else None,
+        'reference_index': {**reference_index.stats(), 'mode': REFERENCE_INDEX_MODE} if reference_index else None,
+        'admission': {
+            endpoint: {**controller.stats(), 'limits': ENDPOINT_LIMITS[endpoint]}
+            for endpoint, controller in admission_controllers.items()
         }
     })
 
 if __name__ == '__main__':
-    load_models()
+    # Modeller arka planda yüklenirken probe'lar hemen cevap verir
+    load_models(background=True)
     app.run(host='0.0.0.0', port=5001, debug=True) 
\ No newline at end of file
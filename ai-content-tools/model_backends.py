@@ -0,0 +1,181 @@
+"""
+Causal LM için seçilebilir CPU inference backend'leri.
+
+    fp32  - PyTorch, tam hassasiyet (varsayılan)
+    int8  - PyTorch dinamik int8 kuantizasyon (Linear katmanları)
+    onnx  - Dışa aktarılmış ONNX Runtime oturumu
+
+Tüm backend'ler model(input_ids=..., attention_mask=..., labels=...) çağrısına
+.logits (ve labels verilirse .loss) içeren bir çıktı ile cevap verir.
+"""
+import logging
+import os
+
+import torch
+from transformers import GPT2LMHeadModel
+from transformers.modeling_outputs import CausalLMOutputWithPast
+from transformers.pytorch_utils import Conv1D
+
+BACKENDS = ('fp32', 'int8', 'onnx')
+
+# Dışa aktarılan ONNX modellerinin tutulduğu dizin
+ONNX_MODEL_DIR = os.environ.get(
+    'ONNX_MODEL_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'onnx_models')
+)
+
+def conv1d_to_linear(model):
+    """
+    GPT-2 attention/MLP projeksiyonları transformers Conv1D kullanır; dinamik
+    kuantizasyonun bunları yakalayabilmesi için eşdeğer nn.Linear'a çevrilir.
+    """
+    for module in list(model.modules()):
+        for child_name, child in list(module.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(module, child_name, linear)
+    return model
+
+def shifted_lm_loss(logits, labels):
+    """HF causal LM loss: bir sonraki token için ortalama cross-entropy"""
+    shift_logits = logits[:, :-1, :].float()
+    shift_labels = labels[:, 1:]
+    return torch.nn.functional.cross_entropy(
+        shift_logits.reshape(-1, shift_logits.size(-1)), shift_labels.reshape(-1)
+    )
+
+class _LogitsOnly(torch.nn.Module):
+    """ONNX export için yalnızca logits döndüren sarmalayıcı"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, use_cache=False).logits
+
+def onnx_model_path(model_name):
+    safe_name = model_name.replace('/', '__')
+    return os.path.join(ONNX_MODEL_DIR, safe_name, 'model.onnx')
+
+def export_onnx(model, path):
+    """fp32 PyTorch modelini dinamik batch/sequence eksenleriyle ONNX'e aktarır"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    dummy_ids = torch.ones((1, 8), dtype=torch.long)
+    dummy_mask = torch.ones((1, 8), dtype=torch.long)
+    logging.info(f"Exporting ONNX model to {path}...")
+    torch.onnx.export(
+        _LogitsOnly(model.cpu().eval()),
+        (dummy_ids, dummy_mask),
+        path,
+        input_names=['input_ids', 'attention_mask'],
+        output_names=['logits'],
+        dynamic_axes={
+            'input_ids': {0: 'batch', 1: 'sequence'},
+            'attention_mask': {0: 'batch', 1: 'sequence'},
+            'logits': {0: 'batch', 1: 'sequence'},
+        },
+        opset_version=14,
+    )
+    return path
+
+class OnnxCausalLM:
+    """
+    ONNX Runtime oturumunu PyTorch modeli gibi çağrılabilir hale getirir.
+
+    Oturum ilk çağrıda, çağıran süreçte oluşturulur: canlı bir ORT oturumu
+    (thread havuzlarıyla) fork'tan sonra güvenle kullanılamaz, bu yüzden pre-fork
+    worker'lar kendi oturumlarını kendi thread sayılarıyla açar.
+    """
+    # Dışa aktarılan graf yalnızca logits döndürür, KV cache yok
+    supports_past_key_values = False
+    # Master'da çağrılmamalı (warmup dahil); oturum worker'da açılır
+    fork_safe = False
+
+    def __init__(self, path, config, num_threads=None):
+        self.config = config
+        self.path = path
+        self.num_threads = num_threads
+        self._session = None
+        self._session_pid = None
+        # Fork ile devralınan oturumlar: yıkıcıları çocukta çalıştırılmaz
+        self._inherited_sessions = []
+
+    @property
+    def session(self):
+        if self._session is None or self._session_pid != os.getpid():
+            import onnxruntime as ort
+
+            if self._session is not None:
+                self._inherited_sessions.append(self._session)
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            options.intra_op_num_threads = self.num_threads or torch.get_num_threads()
+            self._session = ort.InferenceSession(self.path, options, providers=['CPUExecutionProvider'])
+            self._session_pid = os.getpid()
+        return self._session
+
+    def reset_session(self, num_threads=None):
+        """
+        Fork sonrası çağrılır: sonraki çağrı bu süreçte, verilen (ya da o anki
+        torch) thread sayısıyla yeni bir oturum açar
+        """
+        self.num_threads = num_threads
+        if self._session is not None and self._session_pid != os.getpid():
+            self._inherited_sessions.append(self._session)
+            self._session = None
+
+    def eval(self):
+        return self
+
+    def to(self, device):
+        return self
+
+    def __call__(self, input_ids=None, attention_mask=None, labels=None, **kwargs):
+        if kwargs.get('past_key_values') is not None:
+            raise NotImplementedError("ONNX backend does not support past_key_values")
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        logits = self.session.run(['logits'], {
+            'input_ids': input_ids.cpu().numpy(),
+            'attention_mask': attention_mask.cpu().numpy(),
+        })[0]
+        logits = torch.from_numpy(logits)
+        loss = shifted_lm_loss(logits, labels.cpu()) if labels is not None else None
+        return CausalLMOutputWithPast(loss=loss, logits=logits)
+
+def load_causal_lm(model_name, backend, device, source=None, **pretrained_kwargs):
+    """
+    İstenen backend ile causal LM yükler; modele backend_id özniteliği eklenir
+    (cache anahtarları farklı backend'lerin skorlarını karıştırmasın diye).
+    source verilirse ağırlıklar oradan (ör. yerel safetensors dizini) okunur.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {', '.join(BACKENDS)}")
+
+    pretrained_kwargs = {k: v for k, v in pretrained_kwargs.items() if v is not None}
+    model = GPT2LMHeadModel.from_pretrained(source or model_name, **pretrained_kwargs)
+    model.eval()
+
+    if backend == 'int8':
+        if device.type != 'cpu':
+            logging.warning("⚠️ int8 dynamic quantization runs on CPU only; ignoring device.")
+        model = torch.quantization.quantize_dynamic(
+            conv1d_to_linear(model.cpu()), {torch.nn.Linear}, dtype=torch.qint8
+        )
+    elif backend == 'onnx':
+        path = onnx_model_path(model_name)
+        if not os.path.exists(path):
+            export_onnx(model, path)
+        config = model.config
+        del model
+        # Thread sayısı oturum açılırken (worker'da) belirlenir
+        model = OnnxCausalLM(path, config)
+    else:
+        model = model.to(device)
+
+    model.backend_id = f"{model_name}:{backend}"
+    return model
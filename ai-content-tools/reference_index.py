@@ -0,0 +1,281 @@
+"""
+Etiketli referans korpusu (AI / insan) için embedding kNN indeksi.
+
+Embedding matrisi diskte .npy olarak tutulur ve mmap ile açılır; böylece
+on binlerce referans pre-fork worker'lar arasında paylaşılır. Arama iki modda:
+
+    exact - referans matrisi bloklar halinde taranır, her blokta tek bir
+            matris çarpımı + argpartition ile top-k birleştirilir
+    ivf   - küresel k-means ile kümelere ayrılmış referanslarda yalnızca
+            sorguya en yakın nprobe küme taranır (yaklaşık)
+
+IVF eğitildiğinde satırlar küme sırasına dizilir; her küme diskte bitişik
+bir dilimdir ve taraması tek bir ardışık okuma + matris çarpımıdır.
+"""
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+# Etiket id'si = bu demetteki sıra
+LABELS = ('human', 'ai')
+# Exact aramada tek seferde çarpılan referans satırı sayısı
+SEARCH_BLOCK_ROWS = 16384
+
+def normalize_rows(matrix):
+    """Satırları L2 normuna bölünmüş float32 matris döndürür."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def corpus_digest(texts, labels):
+    """Metin + etiket listesinin kısa hash'i (indeks dizini ve cache anahtarı için)"""
+    digest = hashlib.sha256()
+    for text, label in zip(texts, labels):
+        digest.update(f"{int(label)}\x1f{text}\x1e".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def read_corpus(path):
+    """
+    JSONL referans korpusu okur: her satır {"text": ..., "label": "ai" | "human"}.
+    (texts, labels) döndürür; labels, LABELS sırasına göre int8 dizisidir.
+    """
+    texts, labels = [], []
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if item.get('label') not in LABELS or not isinstance(item.get('text'), str):
+                raise ValueError(f"{path}:{line_number}: expected {{\"text\": str, \"label\": {' | '.join(LABELS)}}}")
+            texts.append(item['text'])
+            labels.append(LABELS.index(item['label']))
+    return texts, np.asarray(labels, dtype=np.int8)
+
+def _merge_topk(best_scores, best_ids, scores, ids, k):
+    """İki aday kümesini birleştirip satır başına en yüksek k skoru tutar"""
+    scores = np.concatenate([best_scores, scores], axis=1)
+    ids = np.concatenate([best_ids, ids], axis=1)
+    if scores.shape[1] > k:
+        keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, keep, axis=1)
+        ids = np.take_along_axis(ids, keep, axis=1)
+    return scores, ids
+
+def _save_array(path, array):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.ascontiguousarray(array))
+    os.replace(tmp_path, path)
+
+def _spherical_kmeans(sample, n_lists, iterations, rng):
+    """Normalize satırlar üzerinde küresel k-means; normalize merkezleri döndürür"""
+    centroids = sample[rng.choice(sample.shape[0], n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=n_lists)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        non_empty = counts > 0
+        sums = np.add.reduceat(sample[order], starts[non_empty], axis=0)
+        centroids[non_empty] = normalize_rows(sums)
+        # Boş kalan kümeleri rastgele örneklerle yeniden başlat
+        empty = np.flatnonzero(~non_empty)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(sample.shape[0], len(empty), replace=False)]
+    return centroids
+
+class ReferenceIndex:
+    def __init__(self, embeddings, labels, digest=None, row_ids=None, centroids=None, list_offsets=None):
+        """
+        embeddings: (n x d) normalize float32 matris (np.memmap olabilir)
+        labels: (n,) LABELS id'leri; row_ids: satırın korpustaki orijinal sırası
+        centroids / list_offsets: IVF kümeleri; küme c = satır [offsets[c], offsets[c+1])
+        """
+        self.embeddings = embeddings
+        self.labels = np.asarray(labels, dtype=np.int8)
+        self.digest = digest
+        self.row_ids = row_ids if row_ids is not None else np.arange(len(self.labels), dtype=np.int64)
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self._label_means = None
+
+    @property
+    def size(self):
+        return self.embeddings.shape[0]
+
+    @property
+    def dim(self):
+        return self.embeddings.shape[1]
+
+    @property
+    def has_ivf(self):
+        return self.centroids is not None
+
+    @classmethod
+    def build(cls, encode_fn, texts, labels, batch_size=4096):
+        """
+        encode_fn(list[str]) -> (n x d) ile korpusu parça parça embedding'e çevirir
+        """
+        labels = np.asarray(labels, dtype=np.int8)
+        if len(texts) != len(labels):
+            raise ValueError("texts and labels must have the same length")
+        if not len(texts):
+            raise ValueError("reference corpus is empty")
+        blocks = [normalize_rows(encode_fn(texts[start:start + batch_size]))
+                  for start in range(0, len(texts), batch_size)]
+        return cls(np.concatenate(blocks, axis=0), labels, corpus_digest(texts, labels))
+
+    def save(self, path):
+        """
+        Dizine embeddings.npy, labels.npy, row_ids.npy (+ IVF dosyaları) ve en son
+        meta.json yazar; meta.json yoksa indeks eksik sayılır.
+        """
+        os.makedirs(path, exist_ok=True)
+        _save_array(os.path.join(path, 'embeddings.npy'), self.embeddings)
+        _save_array(os.path.join(path, 'labels.npy'), self.labels)
+        _save_array(os.path.join(path, 'row_ids.npy'), self.row_ids)
+        if self.has_ivf:
+            _save_array(os.path.join(path, 'centroids.npy'), self.centroids)
+            _save_array(os.path.join(path, 'list_offsets.npy'), self.list_offsets)
+        meta = {'digest': self.digest, 'size': self.size, 'dim': self.dim,
+                'ivf_lists': len(self.centroids) if self.has_ivf else 0}
+        tmp_path = os.path.join(path, f'meta.json.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(path, 'meta.json'))
+        return path
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """save() ile yazılmış indeksi açar; embedding matrisi mmap ile okunur"""
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        mmap_mode = 'r' if mmap else None
+        embeddings = np.load(os.path.join(path, 'embeddings.npy'), mmap_mode=mmap_mode)
+        labels = np.load(os.path.join(path, 'labels.npy'))
+        if embeddings.shape[0] != meta['size'] or labels.shape[0] != meta['size']:
+            raise ValueError(f"reference index at {path} is inconsistent with its meta.json")
+        centroids = list_offsets = None
+        if meta.get('ivf_lists'):
+            centroids = np.load(os.path.join(path, 'centroids.npy'))
+            list_offsets = np.load(os.path.join(path, 'list_offsets.npy'))
+        return cls(embeddings, labels, meta.get('digest'), np.load(os.path.join(path, 'row_ids.npy')),
+                   centroids, list_offsets)
+
+    def label_means(self):
+        """
+        Etiket başına ortalama embedding (LABELS x d). Normalize sorgu q için
+        q · mean, o etiketteki tüm referanslara ortalama benzerliğe eşittir.
+        """
+        if self._label_means is None:
+            means = np.zeros((len(LABELS), self.dim), dtype=np.float64)
+            counts = np.bincount(self.labels, minlength=len(LABELS))
+            for start in range(0, self.size, SEARCH_BLOCK_ROWS):
+                block = np.asarray(self.embeddings[start:start + SEARCH_BLOCK_ROWS], dtype=np.float64)
+                for label in range(len(LABELS)):
+                    means[label] += block[self.labels[start:start + SEARCH_BLOCK_ROWS] == label].sum(axis=0)
+            self._label_means = (means / np.maximum(counts, 1)[:, None]).astype(np.float32)
+        return self._label_means
+
+    def train_ivf(self, n_lists=None, iterations=10, sample_size=None, seed=0):
+        """
+        Küresel k-means ile n_lists küme eğitir ve satırları küme sırasına dizer
+        (embedding matrisi belleğe alınır; kalıcı hale getirmek için save()).
+        """
+        n_lists = n_lists or max(1, int(4 * np.sqrt(self.size)))
+        n_lists = min(n_lists, self.size)
+        rng = np.random.default_rng(seed)
+        sample_size = min(self.size, sample_size or n_lists * 64)
+        sample_rows = np.sort(rng.choice(self.size, sample_size, replace=False))
+        centroids = _spherical_kmeans(np.asarray(self.embeddings[sample_rows]), n_lists, iterations, rng)
+
+        assignments = np.concatenate([
+            np.argmax(np.asarray(self.embeddings[start:start + SEARCH_BLOCK_ROWS]) @ centroids.T, axis=1)
+            for start in range(0, self.size, SEARCH_BLOCK_ROWS)
+        ])
+        order = np.argsort(assignments, kind='stable')
+        self.embeddings = np.asarray(self.embeddings)[order]
+        self.labels = self.labels[order]
+        self.row_ids = self.row_ids[order]
+        self.centroids = centroids
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))]).astype(np.int64)
+        logging.info(f"✅ Reference IVF trained: {n_lists} lists over {self.size} references.")
+        return self
+
+    def search(self, queries, k=10, nprobe=None):
+        """
+        Normalize sorgular (m x d) için en benzer k referans.
+        (scores (m x k), rows (m x k), label_max (m x len(LABELS))) döndürür;
+        skorlar azalan sıralıdır. label_max, taranan satırlar içinde etiket başına
+        en yüksek benzerliktir (hiç görülmediyse -1). nprobe verilir ve IVF
+        eğitilmişse yaklaşık arama yapılır.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        k = max(1, min(k, self.size))
+        if nprobe and self.has_ivf:
+            scores, rows, label_max = self._search_ivf(queries, k, nprobe)
+        else:
+            scores, rows, label_max = self._search_exact(queries, k)
+        order = np.argsort(-scores, axis=1)
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(rows, order, axis=1), label_max
+
+    def _scan(self, queries, start, stop, best_scores, best_rows, label_max, k):
+        """[start, stop) satır dilimini tarar, top-k ve label_max'ı günceller"""
+        similarities = queries @ np.asarray(self.embeddings[start:stop]).T
+        block_labels = self.labels[start:stop]
+        for label in range(len(LABELS)):
+            mask = block_labels == label
+            if mask.any():
+                np.maximum(label_max[:, label], similarities[:, mask].max(axis=1), out=label_max[:, label])
+        rows = np.broadcast_to(np.arange(start, stop, dtype=np.int64), similarities.shape)
+        return _merge_topk(best_scores, best_rows, similarities, rows, k)
+
+    def _empty_result(self, n_queries):
+        return (np.empty((n_queries, 0), dtype=np.float32), np.empty((n_queries, 0), dtype=np.int64),
+                np.full((n_queries, len(LABELS)), -1.0, dtype=np.float32))
+
+    def _search_exact(self, queries, k):
+        best_scores, best_rows, label_max = self._empty_result(len(queries))
+        for start in range(0, self.size, SEARCH_BLOCK_ROWS):
+            best_scores, best_rows = self._scan(
+                queries, start, min(start + SEARCH_BLOCK_ROWS, self.size), best_scores, best_rows, label_max, k
+            )
+        return best_scores, best_rows, label_max
+
+    def _search_ivf(self, queries, k, nprobe):
+        nprobe = min(nprobe, len(self.centroids))
+        coarse = queries @ self.centroids.T
+        probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        rows = np.zeros((len(queries), k), dtype=np.int64)
+        label_max = np.full((len(queries), len(LABELS)), -1.0, dtype=np.float32)
+        for i, query in enumerate(queries):
+            best_scores, best_rows, query_max = self._empty_result(1)
+            for list_id in probes[i]:
+                start, stop = self.list_offsets[list_id], self.list_offsets[list_id + 1]
+                if stop > start:
+                    best_scores, best_rows = self._scan(
+                        query[None, :], start, stop, best_scores, best_rows, query_max, k
+                    )
+            # Taranan kümelerde k'dan az satır varsa kalanlar -inf skorla kalır
+            found = best_scores.shape[1]
+            scores[i, :found] = best_scores[0]
+            rows[i, :found] = best_rows[0]
+            label_max[i] = query_max[0]
+        return scores, rows, label_max
+
+    def stats(self):
+        counts = np.bincount(self.labels, minlength=len(LABELS))
+        return {
+            'size': self.size,
+            'dim': self.dim,
+            'digest': self.digest,
+            'labels': {name: int(counts[i]) for i, name in enumerate(LABELS)},
+            'ivf_lists': len(self.centroids) if self.has_ivf else 0,
+        }
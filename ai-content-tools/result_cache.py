@@ -0,0 +1,181 @@
+"""
+İçerik adresli iki katmanlı sonuç cache'i.
+
+Bellekte bir LRU ve isteğe bağlı olarak diskte bir SQLite tablosu tutar.
+Anahtar, normalize edilmiş metin + namespace + model kimliğinin hash'idir;
+değerler threshold'dan bağımsız, JSON'a çevrilebilir skorlardır.
+"""
+import collections
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+
+def normalize_text(text):
+    """Unicode NFC + boşlukları tek boşluğa indirger"""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+def make_key(namespace, text, model_id):
+    payload = '\x1f'.join((namespace, model_id, normalize_text(text)))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResultCache:
+    def __init__(self, max_entries=10000, ttl_seconds=86400, db_path=None, max_disk_entries=1000000):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = float(ttl_seconds) if ttl_seconds else None
+        self.db_path = db_path
+        self.max_disk_entries = int(max_disk_entries)
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_writes = 0
+        self._counters = collections.Counter()
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path):
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS results_created ON results (created)')
+            self._db.commit()
+            logging.info(f"✅ Result cache disk tier opened at {db_path}")
+        except sqlite3.Error as e:
+            logging.error(f"❌ Could not open result cache database {db_path}: {e}")
+            self._db = None
+
+    def reopen(self):
+        """
+        Fork sonrası çocuk süreçte çağrılır: SQLite bağlantıları süreçler arasında
+        paylaşılamaz, bu yüzden kilit ve bağlantı yeniden oluşturulur.
+        """
+        self._lock = threading.Lock()
+        self._db = None
+        if self.db_path:
+            self._open_db(self.db_path)
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key):
+        """Değeri döndürür, yoksa ya da süresi dolmuşsa None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    return value
+                del self._memory[key]
+                self._counters['expired'] += 1
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute('SELECT value, created FROM results WHERE key = ?', (key,)).fetchone()
+                except sqlite3.Error as e:
+                    logging.warning(f"⚠️ Result cache read failed: {e}")
+                    row = None
+                if row is not None:
+                    if not self._expired(row[1], now):
+                        value = json.loads(row[0])
+                        self._store_memory(key, value, row[1])
+                        self._counters['disk_hits'] += 1
+                        return value
+                    self._db.execute('DELETE FROM results WHERE key = ?', (key,))
+                    self._counters['expired'] += 1
+
+            self._counters['misses'] += 1
+            return None
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._store_memory(key, value, now)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO results (key, value, created) VALUES (?, ?, ?)',
+                        (key, json.dumps(value), now)
+                    )
+                    self._disk_writes += 1
+                    # Boyut sınırını arada bir uygula
+                    if self._disk_writes % 1000 == 0:
+                        self._evict_disk(now)
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logging.warning(f"⚠️ Result cache write failed: {e}")
+
+    def _store_memory(self, key, value, created):
+        if self.max_entries == 0:
+            return
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def _evict_disk(self, now):
+        if self.ttl is not None:
+            self._db.execute('DELETE FROM results WHERE created < ?', (now - self.ttl,))
+        count = self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self._db.execute(
+                'DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY created LIMIT ?)',
+                (overflow,)
+            )
+            self._counters['disk_evictions'] += overflow
+
+    def get_or_compute(self, namespace, texts, model_id, compute_fn):
+        """
+        Her metin için cache'teki değeri döndürür; eksikleri (tekilleştirip)
+        tek bir compute_fn(list) çağrısıyla hesaplar ve cache'e yazar.
+        """
+        keys = [make_key(namespace, text, model_id) for text in texts]
+        values = [self.get(key) for key in keys]
+
+        missing = {}
+        for i, value in enumerate(values):
+            if value is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            first_indices = [indices[0] for indices in missing.values()]
+            computed = compute_fn([texts[i] for i in first_indices])
+            for (key, indices), value in zip(missing.items(), computed):
+                self.put(key, value)
+                for i in indices:
+                    values[i] = value
+        return values
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM results')
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            hits = self._counters['memory_hits'] + self._counters['disk_hits']
+            lookups = hits + self._counters['misses']
+            return {
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'disk_enabled': self._db is not None,
+                'memory_hits': self._counters['memory_hits'],
+                'disk_hits': self._counters['disk_hits'],
+                'misses': self._counters['misses'],
+                'evictions': self._counters['evictions'],
+                'disk_evictions': self._counters['disk_evictions'],
+                'expired': self._counters['expired'],
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            }
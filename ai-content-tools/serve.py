@@ -0,0 +1,120 @@
+"""
+main.py için pre-fork üretim sunucusu.
+
+Modeller master süreçte bir kez yüklenir, ardından N worker fork edilir;
+ağırlık sayfaları copy-on-write ile paylaşıldığından resident bellek worker
+sayısıyla doğrusal büyümez. Her worker aynı dinleme soketinden bağlantı kabul
+eder ve torch thread sayısını çekirdek / worker olarak ayarlar.
+
+Kullanım:
+    python serve.py --workers 4 --port 5001
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+
+import torch
+from werkzeug.serving import make_server
+
+import main
+
+def default_workers():
+    return max(1, (os.cpu_count() or 1) // 2)
+
+def threads_per_worker(workers):
+    return max(1, (os.cpu_count() or 1) // workers)
+
+def open_listener(host, port, backlog):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(backlog)
+    listener.set_inheritable(True)
+    return listener
+
+def run_worker(listener, args):
+    """Çocuk süreç: kendi thread havuzunu kurup paylaşılan soketten servis eder"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # reinit_after_fork ONNX oturumlarını bu thread sayısıyla açar
+    torch.set_num_threads(args.threads)
+    main.reinit_after_fork()
+    server = make_server(args.host, args.port, main.app, threaded=True, fd=listener.fileno())
+    logging.info(f"👷 Worker {os.getpid()} serving with {args.threads} torch threads.")
+    try:
+        server.serve_forever()
+    finally:
+        os._exit(0)
+
+def spawn_worker(listener, args):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(listener, args)
+        except BaseException as e:
+            logging.error(f"❌ Worker {os.getpid()} crashed: {e}")
+        os._exit(1)
+    return pid
+
+def serve(args):
+    # Master'da tek thread: fork öncesi OpenMP thread havuzu oluşmasın
+    # (aksi halde çocuklarda kilitlenme riski var)
+    torch.set_num_threads(1)
+    # ONNX oturumları master'da açılmaz; her worker kendi thread sayısıyla açar
+    main.PREFORK_MASTER = True
+    main.load_models()
+    listener = open_listener(args.host, args.port, args.backlog)
+    logging.info(f"✅ Listening on {args.host}:{args.port} with {args.workers} workers "
+                 f"({args.threads} torch threads each).")
+
+    workers = set()
+    shutting_down = False
+
+    def shutdown(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for _ in range(args.workers):
+        workers.add(spawn_worker(listener, args))
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not shutting_down:
+            logging.warning(f"⚠️ Worker {pid} exited with status {status}, respawning.")
+            workers.add(spawn_worker(listener, args))
+    listener.close()
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Pre-fork server for the detection service")
+    parser.add_argument("--host", default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument("--port", type=int, default=int(os.environ.get('PORT', '5001')))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get('WORKERS', default_workers())))
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Worker başına torch thread sayısı (varsayılan: çekirdek / worker)")
+    parser.add_argument("--backlog", type=int, default=2048)
+    return parser
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+    if args.threads is None:
+        args.threads = threads_per_worker(args.workers)
+    if not hasattr(os, 'fork'):
+        sys.exit("serve.py requires os.fork (Linux/macOS)")
+    serve(args)
@@ -0,0 +1,33 @@
+import threading
+
+import pytest
+
+from inference_scheduler import InferenceScheduler
+
+def test_timed_out_job_is_not_scored():
+    started, release = threading.Event(), threading.Event()
+    scored = []
+
+    def score(items):
+        scored.extend(items)
+        started.set()
+        release.wait(5)
+        return [len(item) for item in items]
+
+    scheduler = InferenceScheduler(score, max_batch_size=1, max_wait_ms=0).start()
+    try:
+        # İlk iş worker'ı meşgul eder; ikincisi kuyrukta beklerken zaman aşımına uğrar
+        first = threading.Thread(target=scheduler.submit, args=(['busy'],))
+        first.start()
+        assert started.wait(5)
+        with pytest.raises(TimeoutError):
+            scheduler.submit(['late', 'later'], timeout=0.05)
+        release.set()
+        first.join(5)
+
+        assert scheduler.submit(['ok']) == [2]
+        assert scored == ['busy', 'ok']
+        assert scheduler.stats()['cancelled_items_total'] == 2
+    finally:
+        release.set()
+        scheduler.stop(5)
@@ -0,0 +1,36 @@
+from language_id import LanguageIdentifier
+
+LANGUAGES = {'tr': 'ytu-ce-cosmos/turkish-gpt2-large', 'en': 'gpt2'}
+MIN_CONFIDENCE = 0.62
+
+identifier = LanguageIdentifier()
+
+def route(text):
+    return identifier.route(text, LANGUAGES, 'tr', MIN_CONFIDENCE)[0]
+
+def test_short_brand_titles_stay_on_turkish_model():
+    for title in [
+        "Samsung Galaxy S23 Ultra 256GB Siyah",
+        "Apple iPhone 15 Pro Max Mavi",
+        "Xiaomi Redmi Note 12 Pro 128GB Gri",
+        "Philips Airfryer XXL Siyah",
+        "Logitech MX Master 3S Kablosuz Mouse",
+        "Lenovo IdeaPad 3 Dizüstü Bilgisayar",
+    ]:
+        assert route(title) == 'tr', title
+
+def test_english_sentences_route_to_english():
+    assert route("I bought this phone last week and the battery life is great.") == 'en'
+    assert route("Great product, fast shipping") == 'en'
+
+def test_turkish_sentences_route_to_turkish():
+    assert route("Bu telefonu geçen hafta aldım, pil ömrü harika.") == 'tr'
+
+def test_low_confidence_reports_detected_language():
+    language, detected, confidence = identifier.route("Apple iPhone 15 Pro Max Mavi", LANGUAGES, 'tr', MIN_CONFIDENCE)
+    assert (language, detected) == ('tr', 'en')
+    assert confidence < MIN_CONFIDENCE
+
+def test_unknown_or_short_text_falls_back_to_default():
+    assert identifier.route("ok", LANGUAGES, 'tr')[:2] == ('tr', None)
+    assert identifier.route("I bought this phone last week and the battery life is great.", {'tr': 'x'}, 'tr')[0] == 'tr'